@@ -0,0 +1,173 @@
+from metrics import append_metrics
+from q_network import build_q_net, train
+from replay_memory import ReplayMemory
+from slice_admission_env import SliceAdmissionEnv
+from transition_shards import ShardWriter
+
+import copy
+from datetime import datetime
+from multiprocessing import Process
+from multiprocessing.queues import Queue
+from multiprocessing.sharedctypes import Synchronized
+from multiprocessing.synchronize import Event, Lock
+from queue import Empty
+import numpy as np
+import random
+from time import perf_counter
+import torch
+import torch.multiprocessing as multiprocessing  # shares the weights tensor with the actors
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+from typing import List, Optional, Tuple
+
+from parameters import BACKEND, INPUT_DIM, EPSILON, LEARNING_RATE
+from parameters import EPOCHS, BATCH_SIZE, SYNC_FREQ, ACTORS, UPDATE_TO_DATA, PUBLISH_FREQ, STATS_PERIOD, SHARD_DIR
+
+# Actor -> learner messages
+TRANSITION: int = 0
+EPISODE: int = 1
+
+
+def actor(backend: str, messages: Queue, weights: torch.Tensor, version: Synchronized, lock: Lock, episodes: Synchronized,
+          stop: Event) -> None:
+    torch.set_num_threads(1)  # leave the cores to the learner
+    env: SliceAdmissionEnv = SliceAdmissionEnv(backend)
+    q_net: torch.nn.Sequential = build_q_net()
+    local_version: int = -1
+
+    while not stop.is_set():
+        with episodes.get_lock():
+            episodes.value += 1
+            episode: int = episodes.value
+        if episode > EPOCHS:
+            return
+        epsilon: float = max(EPSILON - (episode - 1) / EPOCHS, 0.1)
+        total_reward: float = 0
+        accepted: List[int] = [0, 0]  # elastic, inelastic
+        rejected: List[int] = [0, 0]
+        steps: int = 0
+        step_time: float = 0.0
+        state: np.ndarray = env.reset().astype(np.float32)
+        done: bool = False
+
+        while not done and not stop.is_set():
+            if version.value != local_version:
+                with lock:
+                    vector_to_parameters(weights, q_net.parameters())
+                    local_version = version.value
+
+            if not state[0]:
+                action: int = 0
+            else:
+                with torch.no_grad():
+                    qval: np.ndarray = q_net(torch.from_numpy(state).reshape(1, INPUT_DIM)).numpy()
+                action: int = np.random.randint(0, 2) if random.random() < epsilon else int(np.argmax(qval))
+                if int(state[0]) in (1, 2):
+                    (accepted if action else rejected)[int(state[0]) - 1] += 1
+
+            started: float = perf_counter()
+            next_state, reward, done, _ = env.step(action)
+            step_time += perf_counter() - started
+            steps += 1
+            next_state = next_state.astype(np.float32)
+            messages.put((TRANSITION, (state, action, reward, next_state, done)))
+            state = next_state
+            total_reward += reward
+
+        messages.put((EPISODE, (episode, epsilon, total_reward, accepted, rejected, step_time / max(steps, 1))))
+
+
+def learner(actors: int = ACTORS, backend: str = BACKEND, update_to_data: float = UPDATE_TO_DATA) -> None:
+    if backend != 'fluid' and actors > 1:
+        raise ValueError("only one emulated SliceAdmissionEnv can run per host, use the fluid backend")
+
+    q_net: torch.nn.Sequential = build_q_net()
+    target_net: torch.nn.Sequential = copy.deepcopy(q_net)
+    loss_fn: torch.nn.Module = torch.nn.MSELoss()
+    optimizer: torch.optim.Optimizer = torch.optim.Adam(q_net.parameters(), lr=LEARNING_RATE)
+    replay: ReplayMemory = ReplayMemory()
+    shards: Optional[ShardWriter] = ShardWriter() if SHARD_DIR else None
+    losses: List[float] = []
+    episode_losses: int = 0
+    update_time: float = 0.0
+
+    weights: torch.Tensor = parameters_to_vector(q_net.parameters()).detach().clone().share_memory_()
+    version: Synchronized = multiprocessing.Value('i', 0)  # bumped every time new weights are published
+    lock: Lock = multiprocessing.Lock()
+    episodes: Synchronized = multiprocessing.Value('i', 0)  # episodes handed out to actors
+    stop: Event = multiprocessing.Event()
+    messages: Queue = multiprocessing.Queue()
+    processes: List[Process] = [multiprocessing.Process(target=actor, args=(backend, messages, weights, version, lock, episodes, stop),
+                                                        daemon=True) for _ in range(actors)]
+    for process in processes:
+        process.start()
+
+    steps: int = 0
+    updates: int = 0
+    finished: int = 0
+    last_report: float = perf_counter()
+    last_counts: Tuple[int, int] = (0, 0)
+
+    while finished < EPOCHS and (any(process.is_alive() for process in processes) or not messages.empty()):
+        learning: bool = len(replay) > BATCH_SIZE and updates < update_to_data * steps
+        drained: int = 0
+        try:
+            kind, data = messages.get_nowait() if learning else messages.get(timeout=1.0)
+            while True:  # at most BATCH_SIZE messages between updates, so fast actors can't keep the learner from training
+                if kind == TRANSITION:
+                    replay.push(*data)
+                    if shards:
+                        shards.push(*data)
+                    steps += 1
+                else:
+                    finished += 1
+                    episode, epsilon, total_reward, accepted, rejected, step_time = data
+                    print(f"\nEpisode {episode} (epsilon {epsilon:.3f}) reward: {total_reward}")
+                    print(f'Accepted:\nElastic: {accepted[0]}\tInelastic: {accepted[1]}\n')
+                    print(f'Rejected:\nElastic: {rejected[0]}\tInelastic: {rejected[1]}\n')
+                    append_metrics(epoch=episode, reward=total_reward, elastic_accepted=accepted[0], inelastic_accepted=accepted[1],
+                                   elastic_rejected=rejected[0], inelastic_rejected=rejected[1],
+                                   loss=np.mean(losses[episode_losses:]) if len(losses) > episode_losses else np.nan,
+                                   step_time=step_time, update_time=update_time / max(len(losses) - episode_losses, 1))
+                    episode_losses, update_time = len(losses), 0.0
+                    if finished % 50 == 0:
+                        torch.save({
+                            'epoch': finished,
+                            'epsilon': epsilon,
+                            'model_state_dict': q_net.state_dict(),
+                            'target_state_dict': target_net.state_dict(),
+                        }, f'models/{datetime.now().strftime("%d-%m-%Y_%H:%M:%S")}.pth')
+                drained += 1
+                if drained == BATCH_SIZE:
+                    break
+                kind, data = messages.get_nowait()
+        except Empty:
+            pass
+
+        while len(replay) > BATCH_SIZE and updates < update_to_data * steps:
+            started: float = perf_counter()
+            losses.append(train(q_net, target_net, optimizer, loss_fn, replay))
+            update_time += perf_counter() - started
+            updates += 1
+            if updates % SYNC_FREQ == 0:
+                target_net.load_state_dict(q_net.state_dict())
+            if updates % PUBLISH_FREQ == 0:
+                with lock:
+                    weights.copy_(parameters_to_vector(q_net.parameters()).detach())
+                    version.value += 1
+
+        now: float = perf_counter()
+        if now - last_report >= STATS_PERIOD:
+            print(f"{(steps - last_counts[0]) / (now - last_report):.1f} steps/s\t"
+                  f"{(updates - last_counts[1]) / (now - last_report):.1f} updates/s\t"
+                  f"{steps} steps\t{updates} updates\t{len(replay)} transitions in memory")
+            last_report, last_counts = now, (steps, updates)
+
+    if shards:
+        shards.flush()
+    stop.set()
+    for process in processes:
+        process.join(timeout=1.0)
+
+
+if __name__ == '__main__':
+    learner()
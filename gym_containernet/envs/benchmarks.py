@@ -0,0 +1,152 @@
+import routing
+from routing import PathIndex, create_paths, get_paths_bottlenecks, load_topology, select_best_paths
+from topology_generator import generate_topology
+
+from collections import defaultdict
+from contextlib import redirect_stdout
+from itertools import cycle
+import json
+import numpy as np
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import Timer
+from typing import Callable, Dict, List, Tuple
+
+from parameters import BASE_STATIONS, COMPUTING_STATIONS, CONNECTIONS_OFFSET, INPUT_DIM
+from parameters import BENCH_BASELINE, BENCH_REPEAT, BENCH_TOLERANCE
+
+SIZES: List[Tuple[int, int, int, int]] = [(32, 4, 8, 3), (64, 7, 14, 3), (128, 14, 28, 4)]  # switches, BS, CS, mesh degree
+
+
+def measure(function: Callable[[], object]) -> float:  # best seconds per call over BENCH_REPEAT rounds
+    timer: Timer = Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(BENCH_REPEAT, number)) / number
+
+
+def routing_benchmarks(switches: int, base_stations: int, computing_stations: int, degree: int) -> Dict[str, float]:
+    name: str = f'{switches}sw_{base_stations}bs_{computing_stations}cs_d{degree}'
+    with tempfile.TemporaryDirectory() as directory:
+        file: str = f'{directory}/topology.txt'
+        generate_topology(file, switches, base_stations, computing_stations, degree)
+        results: Dict[str, float] = {f'load_topology/{name}': measure(lambda: load_topology(file))}
+        mac_name, _, host_switch_port, adjacency, _, graph = load_topology(file)
+
+    paths = create_paths(graph, mac_name, host_switch_port, adjacency)
+    path_index: PathIndex = PathIndex(graph, paths)
+    links: np.ndarray = np.arange(len(path_index.links))
+    weights: np.ndarray = np.random.default_rng(0).uniform(0, 1000000, len(links))
+    loads = cycle([weights, weights / 2])  # every link changes on every call
+    bottlenecks = get_paths_bottlenecks(graph, paths)
+    results[f'create_paths/{name}'] = measure(lambda: create_paths(graph, mac_name, host_switch_port, adjacency))
+    results[f'get_paths_bottlenecks/{name}'] = measure(lambda: get_paths_bottlenecks(graph, paths))
+    results[f'path_index_update_links/{name}'] = measure(lambda: path_index.update_links(links, next(loads)))
+    results[f'select_best_paths/{name}'] = measure(lambda: select_best_paths(paths, bottlenecks, defaultdict(lambda: -1)))
+    return results
+
+
+def env_benchmarks() -> Dict[str, float]:  # on the fluid backend, for the topology.txt of the current directory
+    from slice_admission_env import SliceAdmissionEnv, slice_connections_from_array
+
+    rng: np.random.Generator = np.random.default_rng(0)
+    random.seed(0)
+    np.random.seed(0)
+    connections: np.ndarray = np.zeros(BASE_STATIONS * COMPUTING_STATIONS, dtype=np.float32)
+    connections[rng.choice(len(connections), 2, replace=False)] = 1
+    request: Dict = dict(type=1, duration=10, bw=50.0, price=1.0, connections=connections)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):  # the env reports every decision
+        env: SliceAdmissionEnv = SliceAdmissionEnv('fluid')
+        env.reset()
+
+        def step() -> None:
+            if env.step(random.randint(0, 1))[2]:
+                env.reset()
+
+        return {'slice_connections_from_array': measure(lambda: slice_connections_from_array(connections)),
+                'state_from_request': measure(lambda: env.state_from_request(request)),
+                'env_reset': measure(env.reset),
+                'env_step': measure(step)}
+
+
+def sized_env_benchmarks(switches: int, base_stations: int, computing_stations: int, degree: int) -> Dict[str, float]:
+    # dimensions are read from topology.txt at import, so every size runs in its own process and directory
+    name: str = f'{switches}sw_{base_stations}bs_{computing_stations}cs_d{degree}'
+    here: str = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        generate_topology(f'{directory}/topology.txt', switches, base_stations, computing_stations, degree)
+        shutil.copy(f'{here}/request_templates.txt', directory)
+        if subprocess.run([sys.executable, f'{here}/benchmarks.py', '--env'], cwd=directory).returncode != 0:
+            print(f"No env benchmarks for {name}")
+            return {}
+        with open(f'{directory}/env.json', 'r') as results_file:
+            return {f'{benchmark}/{name}': seconds for benchmark, seconds in json.load(results_file).items()}
+
+
+def agent_benchmarks() -> Dict[str, float]:
+    import copy
+    import torch
+    from q_network import build_q_net, train
+    from replay_memory import ReplayMemory
+
+    rng: np.random.Generator = np.random.default_rng(0)
+    replay: ReplayMemory = ReplayMemory()
+    for _ in range(replay.capacity):
+        state: np.ndarray = rng.uniform(0, 1000, INPUT_DIM).astype(np.float32)
+        state[4:CONNECTIONS_OFFSET] = rng.integers(0, 2, CONNECTIONS_OFFSET - 4)
+        replay.push(state, int(rng.integers(0, 2)), float(rng.normal()), state, False)
+    q_net: torch.nn.Sequential = build_q_net()
+    target_net: torch.nn.Sequential = copy.deepcopy(q_net)
+    optimizer: torch.optim.Optimizer = torch.optim.Adam(q_net.parameters())
+    loss_fn: torch.nn.Module = torch.nn.MSELoss()
+    return {'minibatch_update': measure(lambda: train(q_net, target_net, optimizer, loss_fn, replay)),
+            'replay_sample': measure(lambda: replay.sample(replay.capacity // 5))}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float]) -> List[str]:  # names slower than the baseline allows
+    regressions: List[str] = []
+    for name, seconds in results.items():
+        reference: float = baseline.get(name, 0.0)
+        ratio: float = seconds / reference if reference else 0.0
+        flag: str = ''
+        if reference and ratio > 1 + BENCH_TOLERANCE:
+            flag = 'REGRESSION'
+            regressions += [name]
+        elif reference and ratio < 1 - BENCH_TOLERANCE:
+            flag = 'faster'
+        print(f'{name:<60} {seconds * 1000:>12.4f} ms {f"{ratio:.2f}x" if reference else "n/a":>8} {flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    routing.PATHS_ENUMERATION = 'shortest'  # enumerating every simple path blows up on the larger synthetic meshes
+if __name__ == '__main__' and '--env' in sys.argv:  # child run of sized_env_benchmarks
+    try:
+        env_results: Dict[str, float] = env_benchmarks()
+    except ImportError as error:
+        sys.exit(f"Skipping env benchmarks: {error}")
+    with open('env.json', 'w') as env_results_file:
+        json.dump(env_results, env_results_file)
+elif __name__ == '__main__':  # --save writes the results as the new baseline
+    results: Dict[str, float] = {}
+    for size in SIZES:
+        results.update(routing_benchmarks(*size))
+        results.update(sized_env_benchmarks(*size))
+    try:
+        results.update(agent_benchmarks())
+    except ImportError as error:
+        print(f"Skipping agent benchmarks: {error}")
+
+    baseline: Dict[str, float] = {}
+    if os.path.exists(BENCH_BASELINE):
+        with open(BENCH_BASELINE, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions: List[str] = compare(results, baseline)
+
+    if '--save' in sys.argv:
+        with open(BENCH_BASELINE, 'w') as baseline_file:
+            json.dump(dict(baseline, **results), baseline_file, indent=1, sort_keys=True)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,72 @@
+from replay_memory import ReplayMemory
+
+import copy
+import numpy as np
+import os
+from queue import Queue
+from threading import Thread
+import torch
+from typing import Dict, List, Optional
+
+from parameters import CHECKPOINT_DIR
+
+
+class Checkpointer(Thread):  # writes checkpoints in the background, the replay memory only grows by what changed
+    def __init__(self, directory: str = CHECKPOINT_DIR) -> None:
+        super(Checkpointer, self).__init__(daemon=True)
+        self.directory: str = directory
+        self.pending: Queue = Queue(maxsize=1)
+        # two replay files take turns, training.pth names the complete one, so a crash mid-write leaves the other intact
+        self.saved_pushes: List[int] = [0, 0]
+        self.next_file: int = 0
+        self.error: Optional[BaseException] = None
+        os.makedirs(directory, exist_ok=True)
+        self.start()
+
+    def save(self, state: Dict, replay: ReplayMemory) -> None:  # blocks only while the previous checkpoint is being written
+        self.raise_error()
+        indices, records = replay.changes(self.saved_pushes[self.next_file])
+        self.saved_pushes[self.next_file] = replay.pushed
+        state = dict(state, replay=replay.state_dict(), replay_file=f'replay.{self.next_file}.mem')
+        self.next_file = 1 - self.next_file
+        self.pending.put((copy.deepcopy(state), indices, records))
+
+    def resume(self, replay: ReplayMemory) -> Optional[Dict]:
+        try:
+            state: Dict = torch.load(f'{self.directory}/training.pth', map_location='cpu')
+        except FileNotFoundError:
+            return None
+        replay.load(f'{self.directory}/{state["replay_file"]}', state["replay"])
+        current: int = int(state["replay_file"].split('.')[1])
+        self.saved_pushes = [0, 0]  # the other file may be older or half written, it is rewritten in full
+        self.saved_pushes[current] = replay.pushed
+        self.next_file = 1 - current
+        for name, size in state["files"].items():  # drop results of epochs after the checkpoint, they run again
+            if os.path.exists(name) and os.path.getsize(name) > size:
+                os.truncate(name, size)
+        return state
+
+    def run(self) -> None:
+        while True:
+            state, indices, records = self.pending.get()
+            try:
+                file: str = f'{self.directory}/{state["replay_file"]}'
+                memory: np.ndarray = np.memmap(file, dtype=records.dtype, mode='r+' if os.path.exists(file) else 'w+',
+                                               shape=(state["replay"]["capacity"],))
+                memory[indices] = records
+                memory.flush()
+                del memory
+                torch.save(state, f'{self.directory}/training.pth.tmp')
+                os.replace(f'{self.directory}/training.pth.tmp', f'{self.directory}/training.pth')  # the only switch
+            except BaseException as error:
+                self.error = error
+            finally:
+                self.pending.task_done()
+
+    def raise_error(self) -> None:
+        if self.error:
+            raise RuntimeError("writing the checkpoint failed") from self.error
+
+    def close(self) -> None:
+        self.pending.join()
+        self.raise_error()
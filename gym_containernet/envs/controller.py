@@ -9,146 +9,19 @@ from ryu.lib import hub
 from collections import defaultdict
 from datetime import datetime
 import networkx as nx
-from operator import attrgetter
+import numpy as np
 from os import system
 import socket
-from sys import byteorder
 import time
-from typing import Any, DefaultDict, Dict, List, Tuple, Union
-
-from parameters import TOPOLOGY_FILE, BASE_STATIONS, COMPUTING_STATIONS, PATHS, UPDATE_PERIOD
-
-
-# Custom types
-SwitchPair = Tuple[int, int]  # (1, 2)
-SwitchPort = Tuple[int, int]  # (1, 2)
-MacPair = Tuple[str, str]  # ("00:00:00:00:00:01", "00:00:00:00:00:02")
-Path = List[Tuple[int, int, int]]  # [(1, 1, 4), (6, 1, 2), (2, 4, 1)]
-
-
-def int_to_mac(n: int) -> str:
-    hexadecimal: str = f'{n:012X}'
-    return ':'.join(hexadecimal[i:i + 2] for i in range(0, 12, 2))
-
-
-def load_topology(file: str
-                  ) -> (Dict[str, str], Dict[str, str], Dict[str, SwitchPort], Dict[SwitchPair, int], Dict[SwitchPair, float], nx.Graph):
-    mac_name: Dict[str, str] = {}
-    ip_mac: Dict[str, str] = {}
-    switch_ports: Dict[int, int] = {}
-    host_switch_port: Dict[str, SwitchPort] = {}
-    adjacency: DefaultDict[SwitchPair, int] = defaultdict(lambda: 0)
-    link_bw: Dict[SwitchPair, float] = {}
-    graph: nx.Graph = nx.Graph()
-
-    with open(file, 'r') as topology:
-        for line in topology.readlines():
-            cols: List[str] = line.split()
-            if cols[0][0] != 'S':  # host connects to
-                host_mac: str = int_to_mac(len(host_switch_port) + 1)
-                mac_name[host_mac] = cols[0]
-                if host_mac not in graph:
-                    graph.add_node(host_mac)
-                ip_mac[f'10.0.0.{len(host_switch_port) + 1}'] = host_mac
-                if cols[1][0] == 'S':  # a switch
-                    idx: int = int(cols[1][1:])
-                    switch_ports[idx] = switch_ports[idx] + 1 if switch_ports.get(idx) else 1
-                    host_switch_port[host_mac] = (idx, switch_ports[idx])
-                    if idx not in graph:
-                        graph.add_node(idx)
-                    graph.add_edge(host_mac, idx)
-            else:  # switch connects to
-                s1_idx: int = int(cols[0][1:])
-                if s1_idx not in graph:
-                    graph.add_node(s1_idx)
-                if cols[1][0] == 'S':  # another switch
-                    s2_idx: int = int(cols[1][1:])
-                    # necessary to match mininet ports
-                    switch_ports[s1_idx] = switch_ports[s1_idx] + 1 if switch_ports.get(s1_idx) else 1
-                    switch_ports[s2_idx] = switch_ports[s2_idx] + 1 if switch_ports.get(s2_idx) else 1
-                    adjacency[s1_idx, s2_idx] = switch_ports[s1_idx]
-                    adjacency[s2_idx, s1_idx] = switch_ports[s2_idx]
-                    link_bw[s1_idx, s2_idx] = float(cols[2]) * 1000
-                    link_bw[s2_idx, s1_idx] = float(cols[2]) * 1000
-                    if s2_idx not in graph:
-                        graph.add_node(s2_idx)
-                    graph.add_edge(s1_idx, s2_idx, weight=float(cols[2]) * 1000)
-                else:  # a host
-                    host_mac: str = int_to_mac(len(host_switch_port) + 1)
-                    mac_name[host_mac] = cols[1]
-                    if host_mac not in graph:
-                        graph.add_node(host_mac)
-                    ip_mac[f'10.0.0.{len(host_switch_port) + 1}'] = host_mac
-                    switch_ports[s1_idx] = switch_ports[s1_idx] + 1 if switch_ports.get(s1_idx) else 1
-                    host_switch_port[host_mac] = (s1_idx, switch_ports[s1_idx])
-                    graph.add_edge(host_mac, s1_idx, weight=float(cols[2]) * 1000)
-    return mac_name, ip_mac, host_switch_port, adjacency, link_bw, graph
-
-
-def create_paths(graph: nx.Graph, mac_name: Dict[str, str], host_switch_port: Dict[str, SwitchPort], adjacency: Dict[SwitchPair, int]
-                 ) -> Dict[MacPair, List[Path]]:
-    base_stations: List = [node for node in list(graph.nodes) if mac_name.get(node) and mac_name[node][0] == 'B']
-    computing_stations: List = [node for node in list(graph.nodes) if mac_name.get(node) and
-                                (mac_name[node][0] == 'C' or mac_name[node][0] == 'M')]
-
-    all_paths = {}
-    cutoff = len(set(s1 for (s1, s2) in adjacency.keys())) // 3
-    for bs in base_stations:
-        for cs in computing_stations:
-            all_paths[bs, cs] = sorted(list(nx.all_simple_paths(graph, bs, cs, cutoff)), key=lambda x: len(x))[:PATHS]
-            all_paths[cs, bs] = sorted(list(nx.all_simple_paths(graph, cs, bs, cutoff)), key=lambda x: len(x))[:PATHS]
-
-    for bs_cs_path_list in all_paths.values():
-        for path_idx, path in enumerate(bs_cs_path_list):
-            installable_path: Path = []
-            (switch, in_port) = host_switch_port[path[0]]
-            if len(path) == 3:  # only goes through one switch
-                out_port: int = host_switch_port[path[2]][1]
-                installable_path.append((switch, in_port, out_port))
-            else:
-                out_port: int = adjacency[path[1], path[2]]
-                installable_path.append((switch, in_port, out_port))
-                for i in range(1, len(path) - 3):
-                    section: List[Union[str, int]] = path[i:i + 3]
-                    switch: int = section[1]
-                    in_port: int = adjacency[switch, section[0]]
-                    out_port: int = adjacency[switch, section[2]]
-                    installable_path.append((switch, in_port, out_port))
-                (switch, out_port) = host_switch_port[path[-1]]
-                in_port: int = adjacency[path[-2], path[-3]]
-                installable_path.append((switch, in_port, out_port))
-            bs_cs_path_list[path_idx] = installable_path
-    return all_paths
-
-
-def get_paths_bottlenecks(graph: nx.Graph, paths: Dict[MacPair, List[Path]]) -> Dict[MacPair, List[float]]:
-    bottlenecks: Dict[MacPair, Union[List[None], List[float]]] = defaultdict(lambda: PATHS * [0.0])
-    for (src, dst), path_list in paths.items():
-        for path_idx, path in enumerate(path_list):
-            switches = [switch for (switch, in_port, out_port) in path]
-            if len(switches) > 1:
-                pairs = [(switches[i], switches[i + 1]) for i in range(len(switches) - 1)]
-                bottlenecks[src, dst][path_idx] = min(graph.get_edge_data(*pair)['weight'] for pair in pairs)
-            else:
-                bottlenecks[src, dst][path_idx] = 1000000.0
-    return bottlenecks
-
-
-def select_best_paths(paths: Dict[MacPair, List[Path]], bottlenecks: Dict[MacPair, List[float]], active_paths: Dict[MacPair, int]
-                      ) -> (Dict[MacPair, Path], Dict[MacPair, int]):
-    best_paths: Dict[MacPair, Path] = {}
-    paths_in_use: Dict[MacPair, int] = active_paths.copy()
-    for (src, dst), path_list in paths.items():
-        if paths_in_use[src, dst] != -1:  # if a path is in use, don't change it
-            best_paths[src, dst] = paths[src, dst][paths_in_use[src, dst]]
-        else:
-            best_bottleneck: float = float("-Inf")
-            for path_idx, path in enumerate(path_list):
-                if bottlenecks[src, dst][path_idx] > best_bottleneck:
-                    best_bottleneck = bottlenecks[src, dst][path_idx]
-                    best_paths[src, dst] = path
-                    paths_in_use[src, dst] = path_idx
-    return best_paths, paths_in_use
+from typing import Any, DefaultDict, Dict, List, Set, Tuple, Union
+
+from parameters import TOPOLOGY_FILE, TIME_SCALE
+from parameters import UPDATE_PERIOD, MIN_UPDATE_PERIOD, MAX_UPDATE_PERIOD, TELEMETRY_CHANGE, CONTROLLER_PROFILE_FILE
+from routing import SwitchPair, SwitchPort, MacPair, Path
+from routing import PathIndex, connection_pairs, load_paths, select_best_paths
+from instrumentation import Profiler
+from protocol import BOTTLENECKS_FRAME, PATHS_FRAME, PATHS_DELTA_FRAME, PATHS_ACK_FRAME, PATHS_NACK_FRAME
+from protocol import SLICE_STARTED_FRAME, recv_frame, send_frame
 
 
 def request_stats(datapath: Datapath) -> None:
@@ -158,29 +31,29 @@ def request_stats(datapath: Datapath) -> None:
     datapath.send_msg(req)
 
 
-def install_path(src: str, dst: str, path: Path, switch_datapath: Dict[int, Datapath]) -> None:
-    for switch, in_port, out_port in path:
-        datapath = switch_datapath[switch]
-        proto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
-        actions = [parser.OFPActionOutput(out_port)]
-        inst = [parser.OFPInstructionActions(proto.OFPIT_APPLY_ACTIONS, actions)]
-        mod = parser.OFPFlowMod(datapath=datapath, priority=1, match=match, instructions=inst, idle_timeout=0, hard_timeout=0)
-        datapath.send_msg(mod)
-    print(f"Added path {src} -> {dst}: {path}")
+def add_flow(datapath: Datapath, src: str, dst: str, in_port: int, out_port: int) -> Any:
+    proto = datapath.ofproto
+    parser = datapath.ofproto_parser
+    match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
+    actions = [parser.OFPActionOutput(out_port)]
+    inst = [parser.OFPInstructionActions(proto.OFPIT_APPLY_ACTIONS, actions)]
+    return parser.OFPFlowMod(datapath=datapath, priority=1, match=match, instructions=inst, idle_timeout=0, hard_timeout=0)
 
 
-def uninstall_path(src: str, dst: str, path: Path, switch_datapath: Dict[int, Datapath]) -> None:
-    for switch, in_port, out_port in path:
-        datapath = switch_datapath[switch]
-        proto = datapath.ofproto
-        parser = datapath.ofproto_parser
-        match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
-        mod = parser.OFPFlowMod(datapath=datapath, priority=1, match=match, command=proto.OFPFC_DELETE,
-                                out_group=proto.OFPG_ANY, out_port=proto.OFPP_ANY)
-        datapath.send_msg(mod)
-    print(f"Removed path {src} -> {dst}: {path}")
+def delete_flow(datapath: Datapath, src: str, dst: str, in_port: int) -> Any:
+    proto = datapath.ofproto
+    parser = datapath.ofproto_parser
+    match = parser.OFPMatch(in_port=in_port, eth_src=src, eth_dst=dst)
+    return parser.OFPFlowMod(datapath=datapath, priority=1, match=match, command=proto.OFPFC_DELETE_STRICT,
+                             out_group=proto.OFPG_ANY, out_port=proto.OFPP_ANY)
+
+
+def path_diff(old: Path, new: Path) -> (Dict[SwitchPort, int], List[SwitchPort]):
+    old_rules: Dict[SwitchPort, int] = {(switch, in_port): out_port for (switch, in_port, out_port) in old}
+    new_rules: Dict[SwitchPort, int] = {(switch, in_port): out_port for (switch, in_port, out_port) in new}
+    added: Dict[SwitchPort, int] = {rule: out_port for rule, out_port in new_rules.items() if old_rules.get(rule) != out_port}
+    removed: List[SwitchPort] = [rule for rule in old_rules if rule not in new_rules]
+    return added, removed  # rules shared by both paths are left untouched
 
 
 class Controller(app_manager.RyuApp):
@@ -196,23 +69,43 @@ class Controller(app_manager.RyuApp):
         self.adjacency: Dict[SwitchPair, int]
         self.bw: Dict[SwitchPair, float]
         self.graph: nx.Graph
+        self.paths: Dict[MacPair, List[Path]]
         self.mac_name, self.ip_mac, self.host_switch_port, self.adjacency, \
-            self.bw, self.graph = load_topology(TOPOLOGY_FILE)
+            self.bw, self.graph, self.paths = load_paths(TOPOLOGY_FILE)
 
-        self.paths: Dict[MacPair, List[Path]] = create_paths(self.graph, self.mac_name, self.host_switch_port, self.adjacency)
-        self.bottlenecks: DefaultDict[MacPair, List[float]] = defaultdict(lambda: [0.0] * PATHS)
+        self.bottlenecks: PathIndex = PathIndex(self.graph, self.paths)
+        self.bs_pairs: List[MacPair] = connection_pairs(self.mac_name)
         self.active_paths: DefaultDict[MacPair, int] = defaultdict(lambda: -1)
 
         self.switch_datapath: Dict[int, Datapath] = {}
 
-        self.available_bw: Dict[SwitchPair, float] = defaultdict(lambda: 0.0)
-        self.used_bw: Dict[SwitchPair, float] = defaultdict(lambda: 0.0)
-        self.tx_bytes: Dict[SwitchPair, int] = defaultdict(lambda: 0)
-        self.clock: Dict[SwitchPair, float] = defaultdict(lambda: 0.0)
-
-        self.done_switches: List[int] = []
+        # directed switch links, every per-link counter below is an array indexed by link id
+        self.links: List[SwitchPair] = sorted(self.adjacency.keys())
+        link_id: Dict[SwitchPair, int] = {link: idx for idx, link in enumerate(self.links)}
+        self.port_link: Dict[SwitchPort, int] = {(src, port): link_id[src, dst] for (src, dst), port in self.adjacency.items()}
+        self.reverse_link: np.ndarray = np.array([link_id[dst, src] for (src, dst) in self.links], dtype=np.int64)
+        self.path_links: np.ndarray = self.bottlenecks.link_ids(self.links)
+        self.capacity: np.ndarray = np.array([int(self.bw[link]) * 1024.0 for link in self.links])
+
+        self.available_bw: np.ndarray = np.zeros(len(self.links))
+        self.used_bw: np.ndarray = np.zeros(len(self.links))
+        self.tx_bytes: np.ndarray = np.zeros(len(self.links), dtype=np.int64)
+        self.clock: np.ndarray = np.zeros(len(self.links))
+        self.measured: np.ndarray = np.zeros(len(self.links), dtype=bool)
+        self.reported_bw: np.ndarray = np.zeros(len(self.links))
+
+        self.update_period: float = UPDATE_PERIOD
+        self.sleeping_period: float = UPDATE_PERIOD  # the period monitor_bw is currently waiting out
+        self.telemetry_wake = hub.Event()
+        self.waiting_switches: Set[int] = set()  # polled switches that have not replied yet
         self.bottlenecks_socket: socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.paths_connection: socket = None
+        self.bottlenecks_sequence: int = 0
+        self.pending_barriers: Dict[Tuple[int, int], int] = {}  # (dpid, xid) -> paths frame sequence
+        self.pending_frames: Dict[int, int] = {}  # paths frame sequence -> barrier replies still missing
+        self.profiler: Profiler = Profiler()
+        self.frame_started: Dict[int, float] = {}  # paths frame sequence -> perf_counter when it was received
+        self.round_started: float = 0.0
 
         self.topology_api_app = self
         self.monitor_bw_thread = hub.spawn(self.monitor_bw)
@@ -222,36 +115,104 @@ class Controller(app_manager.RyuApp):
         self.bottlenecks_socket.connect(('127.0.0.1', 6654))
 
         while True:
-            print(datetime.now().strftime("\n\n%H:%M:%S\n"))
-            for switch, datapath in self.switch_datapath.items():
-                request_stats(datapath)
-            hub.sleep(UPDATE_PERIOD)
+            print(datetime.now().strftime(f"\n\n%H:%M:%S (every {self.update_period} s)\n"))
+            self.poll_switches(list(self.switch_datapath.keys()))
+            self.sleeping_period = self.update_period
+            self.telemetry_wake.wait(timeout=self.update_period * TIME_SCALE)
+            self.telemetry_wake.clear()
+
+    def set_update_period(self, period: float) -> None:  # a shorter period cuts the current wait short
+        self.update_period = period
+        if period < self.sleeping_period:
+            self.telemetry_wake.set()
+
+    def poll_switches(self, switches: List[int]) -> None:  # bottlenecks are pushed once all of them replied
+        if not self.waiting_switches:
+            self.round_started = time.perf_counter()
+        for switch in switches:
+            if switch in self.switch_datapath:
+                self.waiting_switches.add(switch)
+                request_stats(self.switch_datapath[switch])
 
     def monitor_paths(self) -> None:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as paths_socket:
             paths_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             paths_socket.bind(('127.0.0.1', 6655))
             paths_socket.listen()
-            self.paths_connection, _ = paths_socket.accept()
+            while True:  # the env resends a full snapshot whenever it reconnects
+                self.paths_connection, _ = paths_socket.accept()
+                self.receive_paths()
+                self.paths_connection.close()
 
+    def receive_paths(self) -> None:
+        sequence: Union[int, None] = None  # deltas are only applied on top of a snapshot
         while True:
-            new_paths = self.active_paths.copy()
-            size = int.from_bytes(self.paths_connection.recv(16), byteorder=byteorder)
             try:
-                data = self.paths_connection.recv(size).decode('utf-8').split(',')
-                if len(data) == BASE_STATIONS * COMPUTING_STATIONS:
-                    for idx, path_idx in enumerate(data):
-                        client: str = int_to_mac(idx // COMPUTING_STATIONS + 1)
-                        server: str = int_to_mac(idx % COMPUTING_STATIONS + BASE_STATIONS + 1)
-                        new_paths[client, server] = int(path_idx) if int(path_idx) != -1 else 0
-                        if new_paths[client, server] != self.active_paths[client, server]:
-                            uninstall_path(client, server, self.paths[client, server][self.active_paths[client, server]], self.switch_datapath)
-                            install_path(client, server, self.paths[client, server][new_paths[client, server]], self.switch_datapath)
-                            self.active_paths[client, server] = new_paths[client, server]
-            except OverflowError:
-                print("\n\n\n\n\n\t\t\t\t\t\t\t\tOVERFLOW ERROR\n\n\n\n\n")
-            except MemoryError:
-                print("\n\n\n\n\n\t\t\t\t\t\t\t\tMEMORY ERROR\n\n\n\n\n")
+                kind, frame_sequence, data = recv_frame(self.paths_connection)
+                if kind == SLICE_STARTED_FRAME:  # the load changes even though no path did
+                    self.set_update_period(MIN_UPDATE_PERIOD)
+                    continue
+                if kind == PATHS_FRAME and len(data) == len(self.bs_pairs):
+                    changes = enumerate(data.tolist())
+                elif kind == PATHS_DELTA_FRAME and sequence is not None and frame_sequence == sequence + 1:
+                    changes = zip(data[0::2].tolist(), data[1::2].tolist())
+                else:
+                    print(f"Dropped paths frame {frame_sequence}, waiting for a snapshot")
+                    sequence = None
+                    send_frame(self.paths_connection, PATHS_NACK_FRAME, np.zeros(0, dtype=np.int16), frame_sequence)
+                    continue
+                sequence = frame_sequence
+                self.apply_paths([change for change in (self.change_path(idx, path_idx) for idx, path_idx in changes) if change],
+                                 frame_sequence)
+            except ValueError as error:
+                print(f"\n\n\n\n\n\t\t\t\t\t\t\t\tPROTOCOL ERROR: {error}\n\n\n\n\n")
+            except ConnectionError:
+                return
+
+    def change_path(self, idx: int, path_idx: int) -> Union[Tuple[MacPair, Path, Path], None]:
+        client, server = self.bs_pairs[idx]
+        new_path: int = path_idx if path_idx != -1 else 0
+        if new_path == self.active_paths[client, server]:
+            return None
+        old_path: Path = self.paths[client, server][self.active_paths[client, server]]
+        self.active_paths[client, server] = new_path
+        return (client, server), old_path, self.paths[client, server][new_path]
+
+    def apply_paths(self, changes: List[Tuple[MacPair, Path, Path]], sequence: int) -> None:
+        flow_mods: DefaultDict[int, List] = defaultdict(list)  # dpid -> pipelined flow mods
+        for (src, dst), old_path, new_path in changes:
+            added, removed = path_diff(old_path, new_path)
+            for (switch, in_port), out_port in added.items():  # adds replace rules with the same match
+                flow_mods[switch] += [add_flow(self.switch_datapath[switch], src, dst, in_port, out_port)]
+            for (switch, in_port) in removed:
+                flow_mods[switch] += [delete_flow(self.switch_datapath[switch], src, dst, in_port)]
+
+        self.pending_frames[sequence] = len(flow_mods)
+        self.frame_started[sequence] = time.perf_counter()
+        for switch, mods in flow_mods.items():
+            datapath = self.switch_datapath[switch]
+            for mod in mods:
+                datapath.send_msg(mod)
+            barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+            datapath.send_msg(barrier)
+            self.pending_barriers[switch, barrier.xid] = sequence
+        print(f"Paths frame {sequence}: {len(changes)} paths changed, "
+              f"{sum(len(mods) for mods in flow_mods.values())} flow mods on {len(flow_mods)} switches")
+        if not flow_mods:
+            self.acknowledge_paths(sequence)
+        else:  # measure the rerouted links as soon as traffic had time to move, then keep polling fast
+            self.set_update_period(MIN_UPDATE_PERIOD)
+            hub.spawn_after(MIN_UPDATE_PERIOD * TIME_SCALE, self.poll_switches, list(flow_mods.keys()))
+
+    def acknowledge_paths(self, sequence: int) -> None:  # every switch confirmed the frame's flow mods
+        del self.pending_frames[sequence]
+        started: float = self.frame_started.pop(sequence)
+        self.profiler.record('install_paths', started, time.perf_counter() - started)  # frame received -> every barrier replied
+        if self.paths_connection:
+            try:
+                send_frame(self.paths_connection, PATHS_ACK_FRAME, np.zeros(0, dtype=np.int16), sequence)
+            except OSError:  # the env reconnected meanwhile, it resends a snapshot
+                pass
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev) -> None:  # create table-miss entries
@@ -270,37 +231,54 @@ class Controller(app_manager.RyuApp):
         datapath = ev.datapath
         self.switch_datapath[datapath.id] = datapath
         if len(self.switch_datapath) == len(set(s1 for (s1, s2) in self.adjacency.keys())):  # after all switches register
-            self.bottlenecks = get_paths_bottlenecks(self.graph, self.paths)
             best_paths, self.active_paths = select_best_paths(self.paths, self.bottlenecks, self.active_paths)
-            for (src, dst), path in best_paths.items():
-                install_path(src, dst, best_paths[src, dst], self.switch_datapath)
+            self.apply_paths([((src, dst), [], path) for (src, dst), path in best_paths.items()], 0)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev) -> None:
+        sequence: Union[int, None] = self.pending_barriers.pop((ev.msg.datapath.id, ev.msg.xid), None)
+        if sequence is not None:
+            self.pending_frames[sequence] -= 1
+            if not self.pending_frames[sequence]:
+                self.acknowledge_paths(sequence)
 
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
     def port_stats_reply_handler(self, ev) -> None:
         msg = ev.msg
         dpid = msg.datapath.id
-        for stat in sorted(msg.body, key=attrgetter('port_no')):
-            for switch in self.switch_datapath.keys():
-                if self.adjacency[dpid, switch] == stat.port_no:
-                    if self.tx_bytes[dpid, switch] > 0:
-                        self.used_bw[dpid, switch] = (stat.tx_bytes - self.tx_bytes[dpid, switch]) * 8.0 \
-                                                     / (time.time() - self.clock[dpid, switch]) / 1000
-                        self.available_bw[dpid, switch] = int(self.bw[dpid, switch]) * 1024.0 - self.used_bw[dpid, switch]
-                    self.tx_bytes[dpid, switch] = stat.tx_bytes
-                    self.clock[dpid, switch] = time.time()
-
-        self.done_switches += [dpid]
-        if len(set(self.done_switches)) == len(self.switch_datapath.keys()):  # all switches recalculated links' bw
-            for (src, dst), bw in sorted(self.available_bw.items()):
-                self.graph[src][dst]['weight'] = min(self.available_bw[src, dst], self.available_bw[dst, src])
-
-            self.bottlenecks = get_paths_bottlenecks(self.graph, self.paths)
-
-            data: str = ''
-            for (src, dst), bottleneck_list in self.bottlenecks.items():
-                if self.mac_name[src][0] == 'B':
-                    data += f'{",".join(str(bottleneck) for bottleneck in bottleneck_list)}\n'
-            self.bottlenecks_socket.sendall(len(data).to_bytes(16, byteorder))
-            self.bottlenecks_socket.sendall(data.encode('utf-8'))
-
-            self.done_switches = []
+        now: float = time.time()  # one timestamp per reply
+        for stat in msg.body:
+            link: int = self.port_link.get((dpid, stat.port_no), -1)
+            if link == -1:  # host or local port
+                continue
+            if self.tx_bytes[link] > 0:
+                self.used_bw[link] = (stat.tx_bytes - self.tx_bytes[link]) * 8.0 / (now - self.clock[link]) / 1000
+                self.available_bw[link] = self.capacity[link] - self.used_bw[link]
+                self.measured[link] = True
+            self.tx_bytes[link] = stat.tx_bytes
+            self.clock[link] = now
+
+        if dpid in self.waiting_switches:
+            self.waiting_switches.discard(dpid)
+            if not self.waiting_switches:  # every polled switch recalculated its links' bw
+                self.push_bottlenecks()
+
+    def push_bottlenecks(self) -> None:
+        self.profiler.record('stats_round', self.round_started, time.perf_counter() - self.round_started)  # poll -> last reply
+        started: float = time.perf_counter()
+        weights: np.ndarray = np.minimum(self.available_bw, self.available_bw[self.reverse_link])
+        update: np.ndarray = (self.measured | self.measured[self.reverse_link]) & (self.path_links != -1)
+        self.bottlenecks.update_links(self.path_links[update], weights[update])  # only paths crossing a changed link
+
+        self.bottlenecks_sequence += 1
+        send_frame(self.bottlenecks_socket, BOTTLENECKS_FRAME, self.bottlenecks.rows(self.bs_pairs).astype(np.float32).ravel(),
+                   self.bottlenecks_sequence)
+
+        # poll fast while the load moves, back off while the network is idle
+        active: bool = np.abs(self.used_bw - self.reported_bw).max(initial=0.0) > TELEMETRY_CHANGE
+        self.reported_bw = self.used_bw.copy()
+        self.set_update_period(MIN_UPDATE_PERIOD if active else min(self.update_period * 2, MAX_UPDATE_PERIOD))
+
+        self.profiler.record('push_bottlenecks', started, time.perf_counter() - started)
+        if CONTROLLER_PROFILE_FILE:
+            self.profiler.export(CONTROLLER_PROFILE_FILE)
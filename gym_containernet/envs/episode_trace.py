@@ -0,0 +1,91 @@
+import numpy as np
+import os
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from parameters import BASE_STATIONS, COMPUTING_STATIONS, PATHS, CONNECTIONS_OFFSET
+
+EVENT_DTYPE: np.dtype = np.dtype([('time', '<f8'),  # backend time for the fluid model, seconds since reset when emulated
+                                  ('type', 'i1'), ('duration', '<i2'), ('bw', '<f4'), ('price', '<f4'),
+                                  ('snapshot', '<i4'),  # row of the bottleneck snapshots seen with this state
+                                  ('action', 'i1'),  # -1 until the agent decides
+                                  ('reward', '<f4'),  # returned by the step that led to this state
+                                  ('slice', '<i4')])  # first port of the admitted or departing slice, -1 otherwise
+RESULT_DTYPE: np.dtype = np.dtype([('slice', '<i4'), ('worst', '<f4'), ('average', '<f4')])  # one per iperf3 connection
+
+
+class TraceRecorder:  # one compressed .npz per episode: every state served, the decisions and what the slices got
+    def __init__(self, directory: str) -> None:
+        self.directory: str = directory
+        self.lock: Lock = Lock()  # evaluators report paths and results from their own threads
+        self.episodes: int = 0
+        self.start: float = perf_counter()
+        self.events: List[Tuple] = []
+        self.connections: List[np.ndarray] = []
+        self.snapshots: List[np.ndarray] = []
+        self.paths: List[Tuple[int, int, int]] = []
+        self.results: List[Tuple[int, float, float]] = []
+        self.departure: int = -1
+        os.makedirs(directory, exist_ok=True)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.start = perf_counter()
+            self.events, self.connections, self.snapshots, self.paths, self.results = [], [], [], [], []
+            self.departure = -1
+
+    def state(self, state: np.ndarray, reward: float = 0.0, now: Optional[float] = None) -> None:
+        bottlenecks: np.ndarray = state[CONNECTIONS_OFFSET + 2:]
+        with self.lock:
+            if not self.snapshots or not np.array_equal(self.snapshots[-1], bottlenecks):
+                self.snapshots += [bottlenecks.copy()]
+            self.events += [[perf_counter() - self.start if now is None else now, state[0], state[1], state[2], state[3],
+                             len(self.snapshots) - 1, -1, reward, self.departure]]
+            self.connections += [np.packbits(state[4:CONNECTIONS_OFFSET] != 0)]
+            self.departure = -1
+
+    def decision(self, action: int) -> None:
+        with self.lock:
+            self.events[-1][6] = action
+
+    def admitted(self, ports: List[int]) -> None:  # the latest state's request became a slice
+        with self.lock:
+            self.events[-1][8] = ports[0]
+
+    def departed(self, slice_id: int) -> None:  # the next state is this slice's departure
+        with self.lock:
+            self.departure = slice_id
+
+    def paths_changed(self, changes: List[Tuple[int, int]]) -> None:
+        with self.lock:
+            self.paths += [(len(self.events) - 1, connection, path) for connection, path in changes]
+
+    def finished(self, slice_id: int, data: List[Dict]) -> None:
+        with self.lock:
+            self.results += [(slice_id, result["worst"], result["average"]) for result in data]
+
+    def write(self) -> str:
+        with self.lock:
+            file: str = f'{self.directory}/episode_{os.getpid()}_{self.episodes:06d}.npz'
+            with open(f'{file}.tmp', 'wb') as trace:
+                np.savez_compressed(trace, dimensions=np.array([BASE_STATIONS, COMPUTING_STATIONS, PATHS]),
+                                    events=np.array([tuple(event) for event in self.events], dtype=EVENT_DTYPE),
+                                    connections=np.array(self.connections, dtype=np.uint8).reshape(len(self.events), -1),
+                                    snapshots=np.array(self.snapshots, dtype=np.float32).reshape(len(self.snapshots), -1),
+                                    paths=np.array(self.paths, dtype=np.int32).reshape(-1, 3),
+                                    results=np.array(self.results, dtype=RESULT_DTYPE))
+            os.replace(f'{file}.tmp', file)
+            self.episodes += 1
+            return file
+
+
+def load_trace(file: str) -> Dict[str, np.ndarray]:
+    with np.load(file) as trace:
+        episode: Dict[str, np.ndarray] = dict(trace)
+    if episode["dimensions"].tolist() != [BASE_STATIONS, COMPUTING_STATIONS, PATHS]:
+        raise ValueError(f"{file} was recorded with {episode['dimensions'].tolist()} base stations, computing stations "
+                         f"and paths, the topology has {[BASE_STATIONS, COMPUTING_STATIONS, PATHS]}")
+    episode["connections"] = np.unpackbits(episode["connections"], axis=1,
+                                           count=BASE_STATIONS * COMPUTING_STATIONS).astype(np.float32)
+    return episode
@@ -0,0 +1,124 @@
+from collections import defaultdict
+import numpy as np
+from typing import Dict, List, Tuple
+
+from parameters import TOPOLOGY_FILE, UPDATE_PERIOD
+from routing import MacPair, PathIndex, connection_pairs, load_paths, select_best_paths
+
+
+def max_min_fair(incidence: np.ndarray, capacities: np.ndarray, demands: np.ndarray) -> np.ndarray:
+    rates: np.ndarray = np.zeros(len(demands))
+    active: np.ndarray = demands > 0
+    while active.any():
+        users: np.ndarray = incidence[:, active].sum(axis=1)
+        loaded: np.ndarray = users > 0
+        residual: np.ndarray = capacities - incidence @ rates
+        share: float = np.min(residual[loaded] / users[loaded]) if loaded.any() else float("Inf")
+        gap: float = np.min(demands[active] - rates[active])
+        rates[active] += max(min(share, gap), 0.0)
+        saturated: np.ndarray = loaded & (capacities - incidence @ rates <= 1e-6)
+        active &= (demands - rates > 1e-6) & ~incidence[saturated].any(axis=0)
+    return rates
+
+
+class FluidBackend:
+    def __init__(self, topology_file: str = TOPOLOGY_FILE) -> None:
+        self.mac_name, _, self.host_switch_port, self.adjacency, self.bw, self.graph, self.paths = load_paths(topology_file)
+        self.name_mac: Dict[str, str] = {name: mac for mac, name in self.mac_name.items()}
+        # same order as the bottleneck lists sent by the controller
+        self.connections: List[MacPair] = connection_pairs(self.mac_name)
+
+        self.links: Dict[Tuple, int] = {}
+        capacities: List[float] = []
+        for u, v, data in self.graph.edges(data=True):
+            for link in ((u, v), (v, u)):
+                self.links[link] = len(capacities)
+                capacities += [data['weight'] / 1000]  # Mbit/s, as given to TCLink
+        self.capacities: np.ndarray = np.array(capacities)
+
+        self.path_links: Dict[MacPair, List[List[int]]] = {}
+        for (src, dst) in self.connections:
+            self.path_links[src, dst] = []
+            for path in self.paths[src, dst]:
+                nodes: List = [src] + [switch for (switch, in_port, out_port) in path] + [dst]
+                self.path_links[src, dst] += [[self.links[nodes[i], nodes[i + 1]] for i in range(len(nodes) - 1)]]
+
+        self.path_index: PathIndex = PathIndex(self.graph, self.paths)
+        _, self.installed = select_best_paths(self.paths, self.path_index, defaultdict(lambda: -1))
+
+        self.now: float = 0.0
+        self.next_update: float = 0.0
+        self.flows: Dict[str, Dict] = {}
+        self.active: Dict[str, Dict] = {}
+        self.used: np.ndarray = np.zeros(len(self.capacities))
+        self.bottlenecks: np.ndarray = np.zeros(0, dtype=np.float32)
+        self.reset()
+
+    def reset(self) -> None:
+        self.now = 0.0
+        self.next_update = UPDATE_PERIOD
+        self.flows = {}
+        self.active = {}
+        self.reallocate()
+        self.update_bottlenecks()
+
+    def advance(self, until: float) -> None:
+        while True:
+            expiry: float = min((flow["end"] for flow in self.active.values()), default=float("Inf"))
+            event: float = min(expiry, self.next_update)
+            if event > until:
+                break
+            self.now = event
+            if expiry <= self.next_update:
+                self.active = {name: flow for name, flow in self.active.items() if flow["end"] > self.now}
+                self.reallocate()
+            else:
+                self.update_bottlenecks()
+                self.next_update += UPDATE_PERIOD
+        self.now = until
+
+    def reallocate(self) -> None:
+        flows: List[Dict] = list(self.active.values())
+        incidence: np.ndarray = np.zeros((len(self.capacities), len(flows)))
+        for idx, flow in enumerate(flows):
+            incidence[self.path_links[flow["connection"]][self.installed[flow["connection"]]], idx] = 1.0
+        rates: np.ndarray = max_min_fair(incidence, self.capacities, np.array([flow["demand"] for flow in flows]))
+        for flow, rate in zip(flows, rates):
+            if flow["segments"] and flow["segments"][-1][0] == self.now:
+                flow["segments"][-1] = (self.now, rate)
+            else:
+                flow["segments"] += [(self.now, rate)]
+        self.used = incidence @ rates
+
+    def update_bottlenecks(self) -> None:  # mirrors Controller.port_stats_reply_handler
+        weights: Dict[Tuple, float] = {}
+        for (src, dst) in self.bw.keys():
+            available: float = int(self.bw[src, dst]) * 1024.0 - self.used[self.links[src, dst]] * 1000
+            reverse: float = int(self.bw[dst, src]) * 1024.0 - self.used[self.links[dst, src]] * 1000
+            weights[src, dst] = min(available, reverse)
+        self.path_index.update(weights)
+        self.bottlenecks = self.path_index.rows(self.connections).astype(np.float32).ravel()
+
+    def update_paths(self, changes: List[Tuple[int, int]]) -> None:  # mirrors Controller.monitor_paths
+        for idx, path_idx in changes:
+            self.installed[self.connections[idx]] = int(path_idx) if int(path_idx) != -1 else 0
+        self.reallocate()
+
+    def slice(self, source: str, destination: str, port: int, duration: int, bw: float) -> None:
+        name: str = f'{source}_{destination}_{port}'
+        self.flows[name] = dict(connection=(self.name_mac[source], self.name_mac[destination]), start=self.now,
+                                end=self.now + int(duration), demand=float(bw), segments=[])
+        self.active[name] = self.flows[name]
+        self.reallocate()
+
+    def results(self, source: str, destination: str, port: int) -> Dict:  # same layout as iperf3 -J
+        flow: Dict = self.flows.pop(f'{source}_{destination}_{port}', None)
+        if not flow or flow["end"] <= flow["start"]:
+            return {}
+        times: np.ndarray = np.array([time for (time, rate) in flow["segments"]] + [flow["end"]])
+        rates: np.ndarray = np.array([rate for (time, rate) in flow["segments"]]) * 1000000.0
+        transferred: np.ndarray = np.concatenate(([0.0], np.cumsum(rates * np.diff(times))))
+        edges: np.ndarray = np.minimum(flow["start"] + np.arange(np.ceil(flow["end"] - flow["start"]) + 1), flow["end"])
+        intervals: np.ndarray = np.diff(np.interp(edges, times, transferred)) / np.diff(edges)
+        return dict(intervals=[dict(streams=[dict(bits_per_second=float(bps))]) for bps in intervals],
+                    end=dict(streams=[dict(receiver=dict(bits_per_second=float(transferred[-1] / (flow["end"] - flow["start"]))))]))
@@ -0,0 +1,81 @@
+from collections import deque
+from contextlib import contextmanager
+import json
+import numpy as np
+import os
+from threading import Lock, get_ident, local
+from time import perf_counter
+from typing import Deque, Dict, Iterator, Optional
+
+from parameters import TRACE_EVENTS
+
+BUCKETS: int = 40  # bucket b counts durations in [2^(b-1), 2^b) microseconds
+
+
+class Profiler:  # named spans, kept as log2 histograms and optionally as Chrome trace events
+    def __init__(self, trace: bool = False) -> None:
+        self.lock: Lock = Lock()
+        self.histograms: Dict[str, np.ndarray] = {}
+        self.totals: Dict[str, float] = {}
+        self.maxima: Dict[str, float] = {}
+        self.trace: bool = trace
+        self.events: Deque[Dict] = deque(maxlen=TRACE_EVENTS)
+        self.origin: float = perf_counter()
+        self.local: local = local()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start: float = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, perf_counter() - start)
+
+    @contextmanager
+    def collect(self) -> Iterator[Dict[str, float]]:  # seconds spent in each span this thread enters meanwhile
+        self.local.timings = {}
+        try:
+            yield self.local.timings
+        finally:
+            self.local.timings = None
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        bucket: int = min(int(duration * 1000000).bit_length(), BUCKETS - 1)
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = np.zeros(BUCKETS, dtype=np.int64)
+                self.totals[name] = 0.0
+                self.maxima[name] = 0.0
+            self.histograms[name][bucket] += 1
+            self.totals[name] += duration
+            self.maxima[name] = max(self.maxima[name], duration)
+            if self.trace:
+                self.events.append(dict(name=name, ph='X', ts=(start - self.origin) * 1000000, dur=duration * 1000000,
+                                        pid=os.getpid(), tid=get_ident()))
+        timings: Optional[Dict[str, float]] = getattr(self.local, 'timings', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + duration
+
+    def summary(self) -> Dict[str, Dict]:  # percentiles are bucket upper bounds, within 2x of the real value
+        with self.lock:
+            summary: Dict[str, Dict] = {}
+            for name, histogram in self.histograms.items():
+                cumulative: np.ndarray = np.cumsum(histogram)
+                count: int = int(cumulative[-1])
+                p50, p99 = (2.0 ** np.searchsorted(cumulative, [0.5 * count, 0.99 * count]) / 1000000).tolist()
+                summary[name] = dict(count=count, total=self.totals[name], mean=self.totals[name] / count,
+                                     p50=min(p50, self.maxima[name]), p99=min(p99, self.maxima[name]), max=self.maxima[name],
+                                     histogram=histogram.tolist())
+            return summary
+
+    def export(self, file: str) -> None:
+        with open(f'{file}.tmp', 'w') as profile:
+            json.dump(self.summary(), profile, indent=1)
+        os.replace(f'{file}.tmp', file)
+
+    def export_trace(self, file: str) -> None:  # loads in chrome://tracing and Perfetto
+        with self.lock:
+            events: list = list(self.events)
+        with open(f'{file}.tmp', 'w') as trace:
+            json.dump(dict(traceEvents=events, displayTimeUnit='ms'), trace)
+        os.replace(f'{file}.tmp', file)
@@ -0,0 +1,147 @@
+import ctypes
+import ctypes.util
+import json
+import math
+import os
+import select
+import struct
+from threading import Event, Lock, Thread
+from time import sleep
+from typing import Dict, List, Set
+
+from parameters import DOCKER_VOLUME, TIME_SCALE
+
+# inotify(7)
+IN_MODIFY: int = 0x002
+IN_CLOSE_WRITE: int = 0x008
+IN_CREATE: int = 0x100
+IN_Q_OVERFLOW: int = 0x4000
+INOTIFY_EVENT: struct.Struct = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+def iperf_duration(duration: int) -> float:  # seconds the flow lasts at its full rate
+    return duration * TIME_SCALE
+
+
+def iperf_seconds(duration: int) -> int:  # iperf3 -t only takes whole seconds, intervals past iperf_duration are trimmed
+    return max(math.ceil(round(iperf_duration(duration), 6)), 1)
+
+
+def iperf_interval() -> float:  # iperf3 refuses intervals under 0.1 s
+    return max(TIME_SCALE, 0.1)
+
+
+def inotify_watch(directory: str) -> int:  # -1 when inotify is not available, the monitor then polls
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd: int = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return -1
+        if libc.inotify_add_watch(fd, directory.encode('utf-8'), IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE) < 0:
+            os.close(fd)
+            return -1
+        return fd
+    except (OSError, AttributeError, TypeError):
+        return -1
+
+
+def failed_summary() -> Dict:  # a connection without any measured interval counts as having carried nothing
+    return dict(worst=0.0, average=0.0)
+
+
+def summarize_iperf(result: Dict, seconds: float = float("Inf")) -> Dict:  # full iperf3 -J document -> same summary the monitor keeps
+    if "error" in result or not result.get("intervals"):  # missing log, iperf3 error document or truncated stream
+        return failed_summary()
+    streams: List[Dict] = [interval["streams"][0] for interval in result["intervals"]]
+    kept: List[float] = [stream["bits_per_second"] / 1000000.0 for stream in streams if stream.get("start", 0.0) < seconds]
+    if not kept:
+        return failed_summary()
+    return dict(worst=min(kept),
+                average=result["end"]["streams"][0]["receiver"]["bits_per_second"] / 1000000.0 if len(kept) == len(streams)
+                else sum(kept) / len(kept))
+
+
+class IperfMonitor(Thread):  # follows the --json-stream logs of running iperf3 clients
+    def __init__(self, directory: str = DOCKER_VOLUME) -> None:
+        super(IperfMonitor, self).__init__(daemon=True)
+        self.directory: str = directory
+        self.fd: int = inotify_watch(directory)
+        self.lock: Lock = Lock()
+        self.connections: Dict[str, Dict] = {}
+
+    def expect(self, name: str, seconds: float = float("Inf")) -> None:  # intervals starting after `seconds` are trimmed
+        with self.lock:
+            self.connections[name] = dict(offset=0, pending=b'', worst=float("Inf"), total=0.0, intervals=0,
+                                          average=None, seconds=seconds, trimmed=False, done=Event())
+
+    def clear(self) -> None:
+        with self.lock:
+            self.connections = {}
+
+    def wait(self, name: str, timeout: float) -> Dict:
+        connection: Dict = self.connections.get(name)
+        finished: bool = connection is not None and connection["done"].wait(timeout)
+        with self.lock:
+            self.connections.pop(name, None)  # finished or timed out, either way it is no longer watched
+        if not finished or not connection["intervals"]:
+            return failed_summary()
+        return dict(worst=connection["worst"],
+                    average=connection["average"] if connection["average"] is not None and not connection["trimmed"]
+                    else connection["total"] / connection["intervals"])
+
+    def run(self) -> None:
+        while True:
+            for name in self.changed_logs():
+                with self.lock:
+                    if name in self.connections and not self.connections[name]["done"].is_set():
+                        self.read(name, self.connections[name])
+
+    def changed_logs(self) -> Set[str]:
+        if self.fd == -1:
+            sleep(0.05)
+            return set(self.connections.keys())
+        readable, _, _ = select.select([self.fd], [], [], 1.0)
+        if not readable:
+            return set(self.connections.keys())  # catch up on anything written before a log was expected
+        data: bytes = os.read(self.fd, 65536)
+        names: Set[str] = set()
+        offset: int = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            if mask & IN_Q_OVERFLOW:
+                return set(self.connections.keys())
+            name: bytes = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            if name.endswith(b'.log'):
+                names.add(name[:-len(b'.log')].decode('utf-8'))
+            offset += INOTIFY_EVENT.size + length
+        return names
+
+    def read(self, name: str, connection: Dict) -> None:
+        try:
+            with open(f'{self.directory}/{name}.log', 'rb') as log:
+                log.seek(connection["offset"])
+                data: bytes = log.read()
+        except FileNotFoundError:
+            return
+        connection["offset"] += len(data)
+        lines: List[bytes] = (connection["pending"] + data).split(b'\n')
+        connection["pending"] = lines.pop()  # last line may still be written
+        for line in lines:
+            try:
+                event: Dict = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("event") == "interval" and event["data"]["streams"][0].get("start", 0.0) >= connection["seconds"]:
+                connection["trimmed"] = True
+            elif event.get("event") == "interval":
+                bps: float = event["data"]["streams"][0]["bits_per_second"] / 1000000.0
+                connection["worst"] = min(connection["worst"], bps)
+                connection["total"] += bps
+                connection["intervals"] += 1
+            elif event.get("event") == "end":
+                streams: List[Dict] = event["data"].get("streams", [])
+                if streams and "receiver" in streams[0]:
+                    connection["average"] = streams[0]["receiver"]["bits_per_second"] / 1000000.0
+                connection["done"].set()
+            elif event.get("event") == "error":
+                connection["done"].set()
@@ -0,0 +1,14 @@
+from typing import List
+
+
+def read_topology(file: str) -> (List[List[str]], List[str], List[str]):  # links, hosts and switches in file order
+    with open(file, 'r') as topology:
+        lines: List[List[str]] = [line.split() for line in topology.readlines() if line.split()]
+    nodes: List[str] = list(dict.fromkeys(node for cols in lines for node in cols[:2]))
+    return lines, [node for node in nodes if node[0] != 'S'], [node for node in nodes if node[0] == 'S']
+
+
+def read_layout(file: str) -> (List[str], List[str]):  # base stations, then computing stations with MECS before CS
+    _, hosts, _ = read_topology(file)
+    return [host for host in hosts if host[0] == 'B'], \
+        [host for host in hosts if host[0] == 'M'] + [host for host in hosts if host[0] == 'C']
@@ -0,0 +1,41 @@
+import numpy as np
+
+from parameters import METRICS_FILE
+
+METRICS_DTYPE: np.dtype = np.dtype([('epoch', '<i4'), ('reward', '<f4'),
+                                    ('elastic_accepted', '<i4'), ('inelastic_accepted', '<i4'),
+                                    ('elastic_rejected', '<i4'), ('inelastic_rejected', '<i4'),
+                                    ('loss', '<f4'),  # mean over the epoch's updates, NaN before training starts
+                                    ('step_time', '<f4'), ('update_time', '<f4')])  # mean seconds per env.step and per update
+
+
+def append_metrics(file: str = METRICS_FILE, **columns: float) -> None:  # one fixed-size record per epoch
+    record: np.ndarray = np.zeros(1, dtype=METRICS_DTYPE)
+    record['loss'] = np.nan
+    for column, value in columns.items():
+        record[column] = value
+    with open(file, 'ab') as metrics_file:
+        metrics_file.write(record.tobytes())
+
+
+def window_averages(cumulative: np.ndarray, size: int) -> np.ndarray:  # cumulative sums starting at 0, one average per group
+    count: int = len(cumulative) - 1
+    starts: np.ndarray = np.arange(0, count, size)
+    return (cumulative[np.minimum(starts + size, count)] - cumulative[starts]) / size
+
+
+class MetricsReader:  # only reads what was appended since the last call
+    def __init__(self, file: str = METRICS_FILE) -> None:
+        self.file: str = file
+        self.offset: int = 0
+
+    def read(self) -> np.ndarray:
+        try:
+            with open(self.file, 'rb') as metrics_file:
+                metrics_file.seek(self.offset)
+                data: bytes = metrics_file.read()
+        except FileNotFoundError:
+            return np.zeros(0, dtype=METRICS_DTYPE)
+        size: int = len(data) - len(data) % METRICS_DTYPE.itemsize  # the last record may still be written
+        self.offset += size
+        return np.frombuffer(data[:size], dtype=METRICS_DTYPE)
@@ -1,20 +1,38 @@
+from layout import read_layout
+
+import os
 from typing import Tuple
 
 # TOPOLOGY MANAGER
 
-TOPOLOGY_FILE: str = 'topology.txt'
+TOPOLOGY_FILE: str = 'topology.txt'  # in the working directory, else the one shipped next to this file
+if not os.path.exists(TOPOLOGY_FILE):
+    TOPOLOGY_FILE = f'{os.path.dirname(os.path.abspath(__file__))}/{TOPOLOGY_FILE}'
 DOCKER_VOLUME: str = '/home/pmsdoliveira/workspace/gym-containernet/docker-volume'
+BRINGUP_WORKERS: int = 16  # threads creating containers and writing neighbor tables
+PERSISTENT_NETWORK: bool = False  # reattach to a running network built from the same topology file instead of rebuilding it
+NETWORK_STAMP: str = f'{DOCKER_VOLUME}/.topology'  # digest of the topology file the running network was built from
 
 
 # CONTROLLER
 
-UPDATE_PERIOD: int = 5   # seconds
+UPDATE_PERIOD: int = 5   # seconds, starting stats period
+MIN_UPDATE_PERIOD: float = 1.0  # stats period right after path changes or load changes
+MAX_UPDATE_PERIOD: float = 20.0  # the idle stats period doubles up to this
+TELEMETRY_CHANGE: float = 1000.0  # Kbit/s change on any link that counts as activity
+PATHS_CACHE: str = 'paths_cache'  # precomputed paths, keyed by topology hash
+PATHS_ENUMERATION: str = 'all'  # 'all' (simple paths up to the cutoff, shortest first) or 'shortest' (Yen, other tie order and actions)
+PATHS_WORKERS: int = 1  # processes used to enumerate paths, 1 runs in-process
+CONTROLLER_PROFILE_FILE: str = ''  # controller span histograms as JSON, rewritten after every stats round
 
 
 # ENVIRONMENT
 
-BASE_STATIONS: int = 7
-COMPUTING_STATIONS: int = 14
+BACKEND: str = 'emulated'  # 'emulated' (Containernet + Ryu) or 'fluid' (in-process max-min fair model)
+
+BASE_STATION_NAMES, COMPUTING_STATION_NAMES = read_layout(TOPOLOGY_FILE)  # connection order, MECS before CS
+BASE_STATIONS: int = len(BASE_STATION_NAMES)
+COMPUTING_STATIONS: int = len(COMPUTING_STATION_NAMES)
 PATHS: int = 7
 PORT_RANGE: Tuple[int, int] = (1024, 4097)
 
@@ -28,6 +46,13 @@ CONNECTIONS_AVERAGE: int = 2
 MAX_REQUESTS: int = 50
 STARTUP_TIME: int = 20
 LOG_TIMEOUT: int = 90
+PATHS_ACK_TIMEOUT: float = 5.0  # seconds to wait for the controller to confirm new paths
+IPERF_JSON_STREAM: bool = False  # follow iperf3 --json-stream logs as they are written (needs iperf3 >= 3.17)
+TIME_SCALE: float = 1.0  # < 1.0 shortens every emulated wait, iperf3 run and stats period by the same factor
+PROFILE_FILE: str = ''  # span histograms as JSON, rewritten on every reset, '' disables the export
+TRACE_FILE: str = ''  # Chrome trace of the most recent spans, rewritten on every reset, '' disables tracing
+TRACE_EVENTS: int = 100000  # spans kept for the trace
+EPISODE_TRACE_DIR: str = ''  # one replayable trace per episode (requests, bottlenecks, decisions, iperf3 results), '' disables it
 
 
 # AGENT
@@ -43,5 +68,31 @@ LEARNING_RATE: float = 1e-3
 
 EPOCHS: int = 5000
 MEM_SIZE: int = 1000
+REPLAY_HALF_BOTTLENECKS: bool = False  # store replayed bottlenecks as float16
+REPLAY_FILE: str = ''  # memory-map the replay memory to this file, '' keeps it in RAM
+SHARD_DIR: str = ''  # also stream every transition into .npy shards here for offline training, '' disables it
+SHARD_SIZE: int = 4096  # transitions per shard
+OFFLINE_UPDATES: int = 10000  # updates run by transition_shards.py
 BATCH_SIZE: int = 200
 SYNC_FREQ: int = 500
+CHECKPOINT_DIR: str = 'checkpoints'  # latest resumable training state, used by --resume
+CHECKPOINT_FREQ: int = 10  # epochs between resumable checkpoints
+METRICS_FILE: str = 'metrics.bin'  # one binary record per epoch, see metrics.METRICS_DTYPE
+PLOT_PERIOD: float = 30.0  # seconds between plot refreshes in plots.py --follow
+
+ACTORS: int = 1  # actor processes running SliceAdmissionEnv, more than one needs the fluid backend
+UPDATE_TO_DATA: float = 1.0  # gradient updates per collected transition
+PUBLISH_FREQ: int = 100  # updates between weight pushes to the actors
+STATS_PERIOD: float = 10.0  # seconds between throughput reports
+
+POLICY_CHECKPOINT: str = ''  # .pth served by policy_server.py when none is given on the command line
+POLICY_PORT: int = 6656
+POLICY_BATCH_SIZE: int = 64  # most queries answered by one forward pass
+POLICY_BATCH_WAIT: float = 0.002  # seconds a batch waits for more queries after the first one
+
+
+# BENCHMARKS
+
+BENCH_BASELINE: str = 'benchmarks.json'  # results saved by benchmarks.py --save, later runs are compared against it
+BENCH_REPEAT: int = 5  # timing rounds, the fastest one counts
+BENCH_TOLERANCE: float = 0.2  # slower than the baseline by more than this fraction is a regression
@@ -1,89 +1,112 @@
+from metrics import MetricsReader, window_averages
+
+import matplotlib
+matplotlib.use('Agg')
 from matplotlib import pylab as plt
-from typing import List
+import numpy as np
+import sys
+from time import sleep
+from typing import Dict, List, Tuple
+
+from parameters import METRICS_FILE, PLOT_PERIOD
+
+plt.rcParams['figure.max_open_warning'] = 0  # every figure stays open to be refreshed
+
+WINDOWS: List[int] = [5, 10, 25, 50, 100, 250, 500]
+COLUMNS: List[str] = ['reward', 'elastic_accepted', 'inelastic_accepted', 'elastic_rejected', 'inelastic_rejected',
+                      'loss', 'step_time', 'update_time']
+
+
+class Buffer:  # grows by doubling, so writing new values costs only the new values
+    def __init__(self, values: np.ndarray = np.zeros(0)) -> None:
+        self.data: np.ndarray = np.zeros(max(len(values), 64))
+        self.data[:len(values)] = values
+        self.size: int = len(values)
+
+    def write(self, start: int, values: np.ndarray) -> None:  # from start on, anything after it is dropped
+        end: int = start + len(values)
+        if end > len(self.data):
+            data: np.ndarray = np.zeros(max(end, 2 * len(self.data)))
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[start:end] = values
+        self.size = end
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
 
 
-def average_rewards(rewards: List[float], size: int) -> None:
-    avg = []
-    for idx in range(0, len(rewards), size):
-        avg += [sum(val for val in rewards[idx:idx + size]) / size]
+class Figure:  # keeps its lines and their points, refreshing only writes the points that changed
+    def __init__(self, file: str, xlabel: str, ylabel: str, styles: List[str]) -> None:
+        self.file: str = file
+        self.figure = plt.figure(figsize=(10, 7))
+        self.axes = self.figure.gca()
+        self.lines: List = [self.axes.plot([], [], style)[0] for style in styles]
+        self.series: List[Buffer] = [Buffer() for _ in styles]
+        self.x: Buffer = Buffer()
+        self.low: float = float("Inf")
+        self.high: float = -float("Inf")
+        self.axes.set_xlabel(xlabel, fontsize=22)
+        self.axes.set_ylabel(ylabel, fontsize=22)
 
-    plt.figure(figsize=(10, 7))
-    plt.plot(avg)
-    plt.xlabel(f"Groups of {size} Epochs", fontsize=22)
-    plt.ylabel("Average Rewards", fontsize=22)
-    plt.savefig(f'avg_rewards_{size}.png')
+    def update(self, start: int, *series: np.ndarray) -> None:  # values of every line from index start on
+        count: int = start + len(series[0])
+        if count == self.x.size and all(np.array_equal(buffer.view()[start:], values, equal_nan=True)
+                                        for buffer, values in zip(self.series, series)):
+            return
+        self.x.write(self.x.size, np.arange(self.x.size, count))
+        for line, buffer, values in zip(self.lines, self.series, series):
+            buffer.write(start, values)
+            line.set_data(self.x.view(), buffer.view())
+            if np.isfinite(values).any():
+                self.low, self.high = min(self.low, np.nanmin(values)), max(self.high, np.nanmax(values))
+        margin: float = 0.05 * (self.high - self.low) or 1.0
+        self.axes.set_xlim(0, max(count - 1, 1))
+        if self.low <= self.high:  # limits only grow, a rewritten partial window may leave them a bit wide
+            self.axes.set_ylim(self.low - margin, self.high + margin)
+        self.figure.savefig(self.file)
 
 
-def average_slices(type: int, elastic: List[int], inelastic: List[int], size: int) -> None:
-    avg_elastic, avg_inelastic = [], []
-    for idx in range(0, len(elastic), size):
-        avg_elastic += [sum(val for val in elastic[idx:idx + size]) / size]
-    for idx in range(0, len(inelastic), size):
-        avg_inelastic += [sum(val for val in inelastic[idx:idx + size]) / size]
+class MetricsPlots:
+    def __init__(self, file: str = METRICS_FILE) -> None:
+        self.reader: MetricsReader = MetricsReader(file)
+        self.count: int = 0
+        self.cumulative: Dict[str, Buffer] = {column: Buffer(np.zeros(1)) for column in COLUMNS}
+        self.figures: List[Tuple[Figure, List[str], int]] = [
+            (Figure('rewards.png', "Epochs", "Rewards", ['-']), ['reward'], 0),
+            (Figure('accepted.png', "Epochs", "Accepted", ['r', 'g']), ['elastic_accepted', 'inelastic_accepted'], 0),
+            (Figure('rejected.png', "Epochs", "Rejected", ['r', 'g']), ['elastic_rejected', 'inelastic_rejected'], 0),
+            (Figure('loss.png', "Epochs", "Loss", ['-']), ['loss'], 0),
+            (Figure('timings.png', "Epochs", "Seconds", ['b', 'm']), ['step_time', 'update_time'], 0)]
+        for size in WINDOWS:
+            self.figures += [
+                (Figure(f'avg_rewards_{size}.png', f"Groups of {size} Epochs", "Average Rewards", ['-']), ['reward'], size),
+                (Figure(f'avg_accepted_accepted_{size}.png', f"Groups of {size} Epochs", "Average Accepted", ['r', 'g']),
+                 ['elastic_accepted', 'inelastic_accepted'], size),
+                (Figure(f'avg_rejected_accepted_{size}.png', f"Groups of {size} Epochs", "Average Rejected", ['r', 'g']),
+                 ['elastic_rejected', 'inelastic_rejected'], size)]
 
-    plt.figure(figsize=(10, 7))
-    plt.plot(range(len(avg_elastic)), avg_elastic, 'r')
-    plt.plot(range(len(avg_inelastic)), avg_inelastic, 'g')
-    plt.xlabel(f"Groups of {size} Epochs", fontsize=22)
-    plt.ylabel(f"Average {'Accepted' if type == 1 else 'Rejected'}", fontsize=22)
-    plt.savefig(f"avg_{'accepted' if type == 1 else 'rejected'}_accepted_{size}.png")
+    def update(self) -> bool:  # False when nothing new was written
+        records: np.ndarray = self.reader.read()
+        if not len(records):
+            return False
+        start: int = self.count
+        self.count += len(records)
+        for column in COLUMNS:
+            cumulative: Buffer = self.cumulative[column]
+            cumulative.write(cumulative.size, cumulative.view()[-1] + np.cumsum(records[column].astype(np.float64)))
+        for figure, columns, size in self.figures:
+            if size:  # the last window may have been partial, it is recomputed with the windows after it
+                first: int = start // size
+                figure.update(first, *[window_averages(self.cumulative[column].view()[first * size:], size) for column in columns])
+            else:
+                figure.update(start, *[records[column].astype(np.float64) for column in columns])
+        return True
 
 
 if __name__ == '__main__':
-    with open("rewards.txt", 'r') as f:
-        data = [float(val) for val in f.readlines()]
-
-    plt.figure(figsize=(10, 7))
-    plt.plot(data)
-    plt.xlabel("Epochs", fontsize=22)
-    plt.ylabel("Rewards", fontsize=22)
-    plt.savefig('rewards.png')
-
-    average_rewards(data, 5)
-    average_rewards(data, 10)
-    average_rewards(data, 25)
-    average_rewards(data, 50)
-    average_rewards(data, 100)
-    average_rewards(data, 250)
-    average_rewards(data, 500)
-
-    elastic_accepted, inelastic_accepted = [], []
-    elastic_rejected, inelastic_rejected = [], []
-    with open('accepted.txt', 'r') as f:
-        lines = f.readlines()
-        for line in lines:
-            ea, ia, er, ir = line.split()
-            elastic_accepted += [int(ea)]
-            inelastic_accepted += [int(ia)]
-            elastic_rejected += [int(er)]
-            inelastic_rejected += [int(ir)]
-
-    plt.figure(figsize=(10, 7))
-    plt.plot(range(len(elastic_accepted)), elastic_accepted, 'r')
-    plt.plot(range(len(inelastic_accepted)), inelastic_accepted, 'g')
-    plt.xlabel("Epochs", fontsize=22)
-    plt.ylabel("Accepted", fontsize=22)
-    plt.savefig('accepted.png')
-
-    average_slices(1, elastic_accepted, inelastic_accepted, 5)
-    average_slices(1, elastic_accepted, inelastic_accepted, 10)
-    average_slices(1, elastic_accepted, inelastic_accepted, 25)
-    average_slices(1, elastic_accepted, inelastic_accepted, 50)
-    average_slices(1, elastic_accepted, inelastic_accepted, 100)
-    average_slices(1, elastic_accepted, inelastic_accepted, 250)
-    average_slices(1, elastic_accepted, inelastic_accepted, 500)
-
-    plt.figure(figsize=(10, 7))
-    plt.plot(range(len(elastic_rejected)), elastic_rejected, 'r')
-    plt.plot(range(len(inelastic_rejected)), inelastic_rejected, 'g')
-    plt.xlabel("Epochs", fontsize=22)
-    plt.ylabel("Rejected", fontsize=22)
-    plt.savefig('rejected.png')
-
-    average_slices(0, elastic_rejected, inelastic_rejected, 5)
-    average_slices(0, elastic_rejected, inelastic_rejected, 10)
-    average_slices(0, elastic_rejected, inelastic_rejected, 25)
-    average_slices(0, elastic_rejected, inelastic_rejected, 50)
-    average_slices(0, elastic_rejected, inelastic_rejected, 100)
-    average_slices(0, elastic_rejected, inelastic_rejected, 250)
-    average_slices(0, elastic_rejected, inelastic_rejected, 500)
+    plots: MetricsPlots = MetricsPlots()
+    plots.update()
+    while '--follow' in sys.argv:  # keep the figures up to date while training runs
+        sleep(PLOT_PERIOD)
+        plots.update()
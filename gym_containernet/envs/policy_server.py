@@ -0,0 +1,112 @@
+from q_network import build_q_net
+from protocol import POLICY_QUERY_FRAME, POLICY_DECISION_FRAME, recv_frame, send_frame
+
+from collections import deque
+import numpy as np
+from queue import Empty, Queue
+import socket
+import sys
+from threading import Thread
+from time import perf_counter
+import torch
+from typing import Deque, List, Tuple
+
+from parameters import INPUT_DIM, POLICY_CHECKPOINT, POLICY_PORT, POLICY_BATCH_SIZE, POLICY_BATCH_WAIT, STATS_PERIOD
+
+Query = Tuple[socket.socket, int, np.ndarray, float]  # client, query id, state, arrival time
+
+
+def load_policy(checkpoint: str) -> torch.jit.ScriptModule:
+    q_net: torch.nn.Sequential = build_q_net()
+    q_net.load_state_dict(torch.load(checkpoint, map_location='cpu')['model_state_dict'])
+    q_net.eval()
+    return torch.jit.optimize_for_inference(torch.jit.script(q_net))
+
+
+class PolicyServer:  # answers admit/reject queries, batching the ones that arrive together
+    def __init__(self, checkpoint: str = POLICY_CHECKPOINT, port: int = POLICY_PORT) -> None:
+        self.policy: torch.jit.ScriptModule = load_policy(checkpoint)
+        self.queries: Queue = Queue()
+        self.latencies: Deque[float] = deque(maxlen=10000)  # seconds, most recent decisions
+        self.batches: int = 0
+        self.decisions: int = 0
+        self.states: np.ndarray = np.zeros((POLICY_BATCH_SIZE, INPUT_DIM), dtype=np.float32)
+        self.socket: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(('127.0.0.1', port))
+        self.socket.listen()
+
+    def serve(self) -> None:
+        Thread(target=self.accept_clients, daemon=True).start()
+        last_report: float = perf_counter()
+        while True:
+            self.decide(self.next_batch())
+            if perf_counter() - last_report >= STATS_PERIOD:
+                self.report()
+                last_report = perf_counter()
+
+    def accept_clients(self) -> None:
+        while True:
+            client, _ = self.socket.accept()
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            Thread(target=self.receive_queries, args=(client,), daemon=True).start()
+
+    def receive_queries(self, client: socket.socket) -> None:
+        try:
+            while True:
+                kind, query_id, state = recv_frame(client)
+                if kind == POLICY_QUERY_FRAME and state.size == INPUT_DIM:
+                    self.queries.put((client, query_id, state, perf_counter()))
+        except (ConnectionError, OSError, ValueError):
+            client.close()
+
+    def next_batch(self) -> List[Query]:  # first query blocks, the rest only wait POLICY_BATCH_WAIT
+        batch: List[Query] = [self.queries.get()]
+        deadline: float = perf_counter() + POLICY_BATCH_WAIT
+        while len(batch) < POLICY_BATCH_SIZE:
+            try:
+                batch += [self.queries.get(timeout=max(deadline - perf_counter(), 0))]
+            except Empty:
+                break
+        return batch
+
+    def decide(self, batch: List[Query]) -> None:
+        states: np.ndarray = self.states[:len(batch)]
+        for idx, (_, _, state, _) in enumerate(batch):
+            states[idx] = state
+        with torch.inference_mode():
+            actions: np.ndarray = self.policy(torch.from_numpy(states)).argmax(dim=1).numpy().astype(np.int16)
+        actions[states[:, 0] == 0] = 0  # nothing to admit on departures
+
+        for (client, query_id, _, arrival), action in zip(batch, actions):
+            try:
+                send_frame(client, POLICY_DECISION_FRAME, action.reshape(1), query_id)
+            except OSError:
+                continue
+            self.latencies.append(perf_counter() - arrival)
+        self.batches += 1
+        self.decisions += len(batch)
+
+    def report(self) -> None:
+        if self.latencies:
+            p50, p99 = np.percentile(np.array(self.latencies), [50, 99]) * 1000
+            print(f"{self.decisions} decisions in {self.batches} batches\tp50 {p50:.3f} ms\tp99 {p99:.3f} ms")
+
+
+class PolicyClient:
+    def __init__(self, port: int = POLICY_PORT) -> None:
+        self.socket: socket.socket = socket.create_connection(('127.0.0.1', port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.query_id: int = 0
+
+    def admit(self, state: np.ndarray) -> bool:
+        self.query_id += 1
+        send_frame(self.socket, POLICY_QUERY_FRAME, state.astype(np.float32).ravel(), self.query_id)
+        while True:
+            kind, query_id, action = recv_frame(self.socket)
+            if kind == POLICY_DECISION_FRAME and query_id == self.query_id:
+                return bool(action[0])
+
+
+if __name__ == '__main__':
+    PolicyServer(sys.argv[1] if len(sys.argv) > 1 else POLICY_CHECKPOINT).serve()
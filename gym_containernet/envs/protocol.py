@@ -0,0 +1,46 @@
+import numpy as np
+import socket
+import struct
+from typing import Dict
+
+PROTOCOL_VERSION: int = 3
+
+# Frame kinds
+BOTTLENECKS_FRAME: int = 1
+PATHS_FRAME: int = 2  # full snapshot, one path index per connection
+PATHS_DELTA_FRAME: int = 3  # (connection index, path index) pairs that changed since the previous frame
+PATHS_ACK_FRAME: int = 4  # controller -> env, the paths frame with this sequence number is installed on every switch
+POLICY_QUERY_FRAME: int = 5  # client -> policy server, one observation, the sequence number identifies the query
+POLICY_DECISION_FRAME: int = 6  # policy server -> client, 1 admits and 0 rejects the query with this sequence number
+PATHS_NACK_FRAME: int = 7  # controller -> env, the paths frame with this sequence number was dropped, send a snapshot
+SLICE_STARTED_FRAME: int = 8  # env -> controller, traffic started on the installed paths, no acknowledgement
+
+HEADER: struct.Struct = struct.Struct('<BBBxII')  # version, kind, dtype code, padding, element count, sequence number
+DTYPES: Dict[int, np.dtype] = {1: np.dtype('<f4'), 2: np.dtype('<i2'), 3: np.dtype('<i4')}
+DTYPE_CODES: Dict[np.dtype, int] = {dtype: code for code, dtype in DTYPES.items()}
+
+
+def send_frame(connection: socket.socket, kind: int, array: np.ndarray, sequence: int = 0) -> None:
+    connection.sendall(HEADER.pack(PROTOCOL_VERSION, kind, DTYPE_CODES[array.dtype], array.size, sequence) + array.tobytes())
+
+
+def recv_exact(connection: socket.socket, size: int) -> bytearray:
+    data: bytearray = bytearray(size)
+    view: memoryview = memoryview(data)
+    received: int = 0
+    while received < size:  # recv may return only part of a frame
+        chunk: int = connection.recv_into(view[received:], size - received)
+        if not chunk:
+            raise ConnectionError("socket closed before a full frame was received")
+        received += chunk
+    return data
+
+
+def recv_frame(connection: socket.socket) -> (int, int, np.ndarray):
+    version, kind, code, count, sequence = HEADER.unpack(recv_exact(connection, HEADER.size))
+    if code not in DTYPES:
+        raise ValueError(f"unknown dtype code {code} in frame header")
+    payload: bytearray = recv_exact(connection, count * DTYPES[code].itemsize)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"protocol version {version} != {PROTOCOL_VERSION}")
+    return kind, sequence, np.frombuffer(payload, dtype=DTYPES[code])
@@ -0,0 +1,31 @@
+from replay_memory import ReplayMemory
+
+import torch
+
+from parameters import INPUT_DIM, HL1, HL2, OUTPUT_DIM, GAMMA, BATCH_SIZE
+
+
+def build_q_net() -> torch.nn.Sequential:
+    return torch.nn.Sequential(
+        torch.nn.Linear(INPUT_DIM, HL1),
+        torch.nn.ReLU(),
+        torch.nn.Linear(HL1, HL2),
+        torch.nn.ReLU(),
+        torch.nn.Linear(HL2, OUTPUT_DIM)
+    )
+
+
+def train(q_net: torch.nn.Sequential, target_net: torch.nn.Sequential, optimizer: torch.optim.Optimizer,
+          loss_fn: torch.nn.Module, replay: ReplayMemory, batch_size: int = BATCH_SIZE) -> float:  # one minibatch update
+    state_batch, action_batch, reward_batch, next_state_batch, done_batch = replay.sample(batch_size)
+    Q1 = q_net(state_batch)
+    with torch.no_grad():
+        Q2 = target_net(next_state_batch)
+
+    Y = reward_batch + GAMMA * ((1 - done_batch) * torch.max(Q2, dim=1)[0])
+    X = Q1.gather(dim=1, index=action_batch.unsqueeze(dim=1)).squeeze()
+    loss = loss_fn(X, Y.detach())
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+    return loss.item()
@@ -0,0 +1,110 @@
+from episode_trace import load_trace
+from slice_admission_env import evaluate_elastic_slice, evaluate_inelastic_slice
+
+from gym import Env
+from gym.spaces import Box, Discrete
+from glob import glob
+from heapq import heappop, heappush
+import numpy as np
+import sys
+from typing import Dict, List, Tuple
+
+from parameters import CONNECTIONS_OFFSET, INPUT_DIM, OUTPUT_DIM, EPISODE_TRACE_DIR
+
+
+class ReplayEnv(Env):  # serves recorded episodes without an emulator, decisions may differ from the recorded ones
+    def __init__(self, files: List[str]) -> None:
+        self.files: List[str] = sorted(files)
+        self.observation_space: Box = Box(low=0.0, high=np.inf, shape=(INPUT_DIM,), dtype=np.float32)
+        self.action_space: Discrete = Discrete(OUTPUT_DIM)
+        self.state: np.ndarray = np.zeros(INPUT_DIM, dtype=np.float32)
+        self.episode: Dict[str, np.ndarray] = {}
+        self.episodes: int = 0
+        self.cursor: int = 0
+        self.results: Dict[int, List[Dict]] = {}
+        self.admitted: Dict[int, int] = {}  # recorded slice -> event that requested it
+        self.unmeasured: List[Tuple[float, int, int]] = []  # (end, event, type) of slices the recording rejected
+        self.unmeasured_slices: int = 0  # admitted here but not in the recording, they depart with a reward of 0
+
+    def reset(self) -> object:
+        self.episode = load_trace(self.files[self.episodes % len(self.files)])
+        self.episodes += 1
+        self.results = {}
+        for slice_id, worst, average in self.episode["results"].tolist():
+            self.results.setdefault(slice_id, []).append(dict(worst=worst, average=average))
+        self.admitted = {}
+        self.unmeasured = []
+        self.unmeasured_slices = 0
+        self.state = np.zeros(INPUT_DIM, dtype=np.float32)
+        self.cursor = 0
+        self.serve(self.cursor)
+        return self.state
+
+    def step(self, action) -> (object, float, bool, dict):
+        event: np.void = self.episode["events"][self.cursor]
+        reward: float = 0.0
+        if self.state[0] and action:  # the state may also be a departure served between recorded events
+            self.state[CONNECTIONS_OFFSET + event["type"] - 1] += 1
+            reward = float(event["duration"] * event["price"])
+            if event["slice"] != -1:
+                self.admitted[int(event["slice"])] = self.cursor
+            else:
+                heappush(self.unmeasured, (event["time"] + event["duration"], self.cursor, int(event["type"])))
+                self.unmeasured_slices += 1
+
+        events: np.ndarray = self.episode["events"]
+        while True:
+            end: float = events[self.cursor + 1]["time"] if self.cursor + 1 < len(events) else float("Inf")
+            if self.unmeasured and self.unmeasured[0][0] <= end:  # keeps the recorded order for departures it knows of
+                _, _, slice_type = heappop(self.unmeasured)
+                self.serve(min(self.cursor + 1, len(events) - 1), departure=slice_type)
+                return self.state, reward, False, dict(unmeasured=True)
+            self.cursor += 1
+            if self.cursor == len(events):
+                self.cursor -= 1
+                return self.state, reward, True, {}
+            departed: int = int(events[self.cursor]["slice"]) if events[self.cursor]["type"] == 0 else -1
+            if events[self.cursor]["type"] == 0 and departed not in self.admitted:
+                continue  # the recording admitted this slice, the replayed decision did not
+            self.serve(self.cursor)
+            if departed != -1:
+                reward += self.departure_reward(self.admitted.pop(departed), departed)
+            return self.state, reward, False, {}
+
+    def serve(self, idx: int, departure: int = 0) -> None:  # state of a recorded event, or a bare departure of the given type
+        event: np.void = self.episode["events"][idx]
+        self.state[:CONNECTIONS_OFFSET] = 0.0
+        if departure:
+            self.state[CONNECTIONS_OFFSET + departure - 1] -= 1
+        elif event["type"]:
+            self.state[0:4] = event["type"], event["duration"], event["bw"], event["price"]
+            self.state[4:CONNECTIONS_OFFSET] = self.episode["connections"][idx]
+        self.state[CONNECTIONS_OFFSET + 2:] = self.episode["snapshots"][event["snapshot"]]
+
+    def departure_reward(self, request_idx: int, slice_id: int) -> float:
+        request: np.void = self.episode["events"][request_idx]
+        self.state[CONNECTIONS_OFFSET + request["type"] - 1] -= 1
+        data: List[Dict] = self.results.get(slice_id, [])
+        if request["type"] == 1:
+            return evaluate_elastic_slice(float(request["bw"]), float(request["duration"] * request["price"]), data)
+        return evaluate_inelastic_slice(float(request["bw"]), float(request["duration"] * request["price"]), data)
+
+    def render(self, mode='human') -> None:
+        pass
+
+
+if __name__ == '__main__':  # replays the recorded decisions, the rewards have to match the recording
+    files: List[str] = sorted(glob(f'{sys.argv[1] if len(sys.argv) > 1 else EPISODE_TRACE_DIR}/*.npz'))
+    env: ReplayEnv = ReplayEnv(files)
+    mismatches: int = 0
+    for file in files:
+        env.reset()
+        recorded: float = float(env.episode["events"]["reward"].sum())
+        replayed: float = 0.0
+        done: bool = False
+        while not done:
+            _, reward, done, _ = env.step(int(env.episode["events"][env.cursor]["action"] == 1))
+            replayed += reward
+        mismatches += abs(recorded - replayed) > 1e-3
+        print(f"{file}\trecorded {recorded:.2f}\treplayed {replayed:.2f}")
+    sys.exit(1 if mismatches else 0)
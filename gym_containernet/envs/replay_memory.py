@@ -0,0 +1,94 @@
+import numpy as np
+import torch
+from typing import Dict, Tuple
+
+from parameters import BASE_STATIONS, COMPUTING_STATIONS, CONNECTIONS_OFFSET, INPUT_DIM
+from parameters import MEM_SIZE, REPLAY_HALF_BOTTLENECKS, REPLAY_FILE
+
+CONNECTIONS: int = BASE_STATIONS * COMPUTING_STATIONS
+BOTTLENECKS_OFFSET: int = CONNECTIONS_OFFSET + 2
+BOTTLENECK_SCALE: float = 1024.0  # Kbit/s -> Mbit/s, keeps float16 bottlenecks under its 65504 maximum
+
+
+def state_dtype(half_bottlenecks: bool) -> np.dtype:  # one observation: request, bit-packed connections, slice counts, bottlenecks
+    return np.dtype([('request', np.float32, 4),
+                     ('connections', np.uint8, (CONNECTIONS + 7) // 8),
+                     ('slices', np.float32, 2),
+                     ('bottlenecks', np.float16 if half_bottlenecks else np.float32, INPUT_DIM - BOTTLENECKS_OFFSET)])
+
+
+def transition_dtype(half_bottlenecks: bool) -> np.dtype:
+    state: np.dtype = state_dtype(half_bottlenecks)
+    return np.dtype([('state', state), ('action', np.int64), ('reward', np.float32), ('next_state', state), ('done', np.float32)],
+                    align=True)
+
+
+def bottleneck_scale(dtype: np.dtype) -> float:  # float16 bottlenecks were stored in Mbit/s
+    return BOTTLENECK_SCALE if dtype['state']['bottlenecks'].base == np.float16 else 1.0
+
+
+def decode_states(records: np.ndarray, scale: float, out: np.ndarray) -> np.ndarray:
+    out[:, :4] = records['request']
+    out[:, 4:CONNECTIONS_OFFSET] = np.unpackbits(records['connections'], axis=1, count=CONNECTIONS)
+    out[:, CONNECTIONS_OFFSET:BOTTLENECKS_OFFSET] = records['slices']
+    np.multiply(records['bottlenecks'], scale, out=out[:, BOTTLENECKS_OFFSET:], dtype=np.float32)
+    return out
+
+
+class ReplayMemory:  # fixed-size ring buffer of transitions, optionally backed by a memory-mapped file
+    def __init__(self, capacity: int = MEM_SIZE, half_bottlenecks: bool = REPLAY_HALF_BOTTLENECKS, file: str = REPLAY_FILE) -> None:
+        self.capacity: int = capacity
+        self.dtype: np.dtype = transition_dtype(half_bottlenecks)
+        self.scale: float = bottleneck_scale(self.dtype)
+        if file:
+            self.memory: np.ndarray = np.memmap(file, dtype=self.dtype, mode='w+', shape=(capacity,))
+        else:
+            self.memory: np.ndarray = np.zeros(capacity, dtype=self.dtype)
+        self.position: int = 0
+        self.size: int = 0
+        self.pushed: int = 0  # transitions pushed since the memory was created, checkpoints only copy newer ones
+        self.batch: Tuple[np.ndarray, np.ndarray] = (np.empty(0), np.empty(0))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def encode(self, record: np.void, state: np.ndarray) -> None:
+        record['request'] = state[:4]
+        record['connections'] = np.packbits(state[4:CONNECTIONS_OFFSET] > 0)
+        record['slices'] = state[CONNECTIONS_OFFSET:BOTTLENECKS_OFFSET]
+        record['bottlenecks'] = state[BOTTLENECKS_OFFSET:] / self.scale
+
+    def push(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray, done: bool) -> None:
+        record: np.void = self.memory[self.position]
+        self.encode(record['state'], state)
+        self.encode(record['next_state'], next_state)
+        record['action'] = action
+        record['reward'] = reward
+        record['done'] = done
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.pushed += 1
+
+    def changes(self, since: int) -> (np.ndarray, np.ndarray):  # slots written after the first `since` pushes, and a copy of them
+        count: int = min(self.pushed - since, self.capacity)
+        indices: np.ndarray = (self.position - count + np.arange(count)) % self.capacity
+        return indices, self.memory[indices]
+
+    def state_dict(self) -> Dict:
+        return dict(capacity=self.capacity, dtype=str(self.dtype.descr), position=self.position, size=self.size, pushed=self.pushed)
+
+    def load(self, file: str, state: Dict) -> None:
+        if state["capacity"] != self.capacity or state["dtype"] != str(self.dtype.descr):
+            raise ValueError(f"replay memory in {file} does not match MEM_SIZE and REPLAY_HALF_BOTTLENECKS")
+        self.memory[:] = np.memmap(file, dtype=self.dtype, mode='r', shape=(self.capacity,))
+        self.position, self.size, self.pushed = state["position"], state["size"], state["pushed"]
+
+    def sample(self, batch_size: int) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        if len(self.batch[0]) != batch_size:  # decoded states are written into the same buffers every batch
+            self.batch = (np.empty((batch_size, INPUT_DIM), dtype=np.float32), np.empty((batch_size, INPUT_DIM), dtype=np.float32))
+        records: np.ndarray = self.memory[np.random.randint(0, self.size, batch_size)]
+        return (torch.from_numpy(decode_states(records['state'], self.scale, self.batch[0])),
+                torch.from_numpy(np.ascontiguousarray(records['action'])),
+                torch.from_numpy(np.ascontiguousarray(records['reward'])),
+                torch.from_numpy(decode_states(records['next_state'], self.scale, self.batch[1])),
+                torch.from_numpy(np.ascontiguousarray(records['done'])))
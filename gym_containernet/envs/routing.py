@@ -0,0 +1,291 @@
+from collections import defaultdict
+import hashlib
+from ipaddress import IPv4Address
+from itertools import islice, takewhile
+from multiprocessing import Pool
+import networkx as nx
+import numpy as np
+import os
+import pickle
+from typing import DefaultDict, Dict, Iterator, List, Tuple, Union
+
+from parameters import BASE_STATION_NAMES, COMPUTING_STATION_NAMES, PATHS, PATHS_CACHE, PATHS_ENUMERATION, PATHS_WORKERS
+
+
+# Custom types
+SwitchPair = Tuple[int, int]  # (1, 2)
+SwitchPort = Tuple[int, int]  # (1, 2)
+MacPair = Tuple[str, str]  # ("00:00:00:00:00:01", "00:00:00:00:00:02")
+Path = List[Tuple[int, int, int]]  # [(1, 1, 4), (6, 1, 2), (2, 4, 1)]
+
+PATHS_CACHE_FORMAT: int = 1  # part of the cache key, bump whenever load_topology or create_paths change what they return
+
+
+def int_to_mac(n: int) -> str:
+    hexadecimal: str = f'{n:012X}'
+    return ':'.join(hexadecimal[i:i + 2] for i in range(0, 12, 2))
+
+
+def host_ip(n: int) -> str:  # n-th host of the 10.0.0.0/8 network, past .255 for large topologies
+    return str(IPv4Address('10.0.0.0') + n)
+
+
+def connection_pairs(mac_name: Dict[str, str]) -> List[MacPair]:  # every BS to every computing station, state order
+    name_mac: Dict[str, str] = {name: mac for mac, name in mac_name.items()}
+    return [(name_mac[client], name_mac[server]) for client in BASE_STATION_NAMES for server in COMPUTING_STATION_NAMES]
+
+
+def load_topology(file: str
+                  ) -> (Dict[str, str], Dict[str, str], Dict[str, SwitchPort], Dict[SwitchPair, int], Dict[SwitchPair, float], nx.Graph):
+    mac_name: Dict[str, str] = {}
+    ip_mac: Dict[str, str] = {}
+    switch_ports: Dict[int, int] = {}
+    host_switch_port: Dict[str, SwitchPort] = {}
+    adjacency: DefaultDict[SwitchPair, int] = defaultdict(lambda: 0)
+    link_bw: Dict[SwitchPair, float] = {}
+    graph: nx.Graph = nx.Graph()
+
+    with open(file, 'r') as topology:
+        for line in topology.readlines():
+            cols: List[str] = line.split()
+            if cols[0][0] != 'S':  # host connects to
+                host_mac: str = int_to_mac(len(host_switch_port) + 1)
+                mac_name[host_mac] = cols[0]
+                if host_mac not in graph:
+                    graph.add_node(host_mac)
+                ip_mac[host_ip(len(host_switch_port) + 1)] = host_mac
+                if cols[1][0] == 'S':  # a switch
+                    idx: int = int(cols[1][1:])
+                    switch_ports[idx] = switch_ports[idx] + 1 if switch_ports.get(idx) else 1
+                    host_switch_port[host_mac] = (idx, switch_ports[idx])
+                    if idx not in graph:
+                        graph.add_node(idx)
+                    graph.add_edge(host_mac, idx, weight=float(cols[2]) * 1000)
+            else:  # switch connects to
+                s1_idx: int = int(cols[0][1:])
+                if s1_idx not in graph:
+                    graph.add_node(s1_idx)
+                if cols[1][0] == 'S':  # another switch
+                    s2_idx: int = int(cols[1][1:])
+                    # necessary to match mininet ports
+                    switch_ports[s1_idx] = switch_ports[s1_idx] + 1 if switch_ports.get(s1_idx) else 1
+                    switch_ports[s2_idx] = switch_ports[s2_idx] + 1 if switch_ports.get(s2_idx) else 1
+                    adjacency[s1_idx, s2_idx] = switch_ports[s1_idx]
+                    adjacency[s2_idx, s1_idx] = switch_ports[s2_idx]
+                    link_bw[s1_idx, s2_idx] = float(cols[2]) * 1000
+                    link_bw[s2_idx, s1_idx] = float(cols[2]) * 1000
+                    if s2_idx not in graph:
+                        graph.add_node(s2_idx)
+                    graph.add_edge(s1_idx, s2_idx, weight=float(cols[2]) * 1000)
+                else:  # a host
+                    host_mac: str = int_to_mac(len(host_switch_port) + 1)
+                    mac_name[host_mac] = cols[1]
+                    if host_mac not in graph:
+                        graph.add_node(host_mac)
+                    ip_mac[host_ip(len(host_switch_port) + 1)] = host_mac
+                    switch_ports[s1_idx] = switch_ports[s1_idx] + 1 if switch_ports.get(s1_idx) else 1
+                    host_switch_port[host_mac] = (s1_idx, switch_ports[s1_idx])
+                    graph.add_edge(host_mac, s1_idx, weight=float(cols[2]) * 1000)
+    return mac_name, ip_mac, host_switch_port, adjacency, link_bw, graph
+
+
+def paths_of_length(graph: nx.Graph, src: str, dst: str, length: int, distance: Dict) -> Iterator[List[Union[str, int]]]:
+    path: List[Union[str, int]] = [src]  # same depth-first order as all_simple_paths, branches that can't reach dst in time are cut
+    neighbors: List[Iterator] = [iter(graph[src])]
+    while neighbors:
+        child = next(neighbors[-1], None)
+        if child is None:
+            neighbors.pop()
+            path.pop()
+        elif child == dst:
+            if len(path) == length:
+                yield path + [dst]
+        elif child not in path and len(path) + distance.get(child, length) <= length:
+            path.append(child)
+            neighbors.append(iter(graph[child]))
+
+
+def candidate_paths(graph: nx.Graph, src: str, dst: str, cutoff: int) -> List[List[Union[str, int]]]:
+    if PATHS_ENUMERATION == 'all':  # all_simple_paths sorted by length, without listing the paths that are cut off anyway
+        distance: Dict = nx.single_source_shortest_path_length(graph, dst, cutoff)
+        paths: List[List[Union[str, int]]] = []
+        for length in range(distance.get(src, cutoff + 1), cutoff + 1):
+            paths += islice(paths_of_length(graph, src, dst, length, distance), PATHS - len(paths))
+            if len(paths) == PATHS:
+                break
+        return paths
+    try:  # shortest_simple_paths yields loop-free paths by increasing length, stop after PATHS
+        return list(islice(takewhile(lambda path: len(path) - 1 <= cutoff, nx.shortest_simple_paths(graph, src, dst)), PATHS))
+    except nx.NetworkXNoPath:
+        return []
+
+
+worker_graph: nx.Graph = None
+
+
+def init_paths_worker(graph: nx.Graph) -> None:
+    global worker_graph
+    worker_graph = graph
+
+
+def pair_candidate_paths(src: str, dst: str, cutoff: int) -> List[List[Union[str, int]]]:
+    return candidate_paths(worker_graph, src, dst, cutoff)
+
+
+def create_paths(graph: nx.Graph, mac_name: Dict[str, str], host_switch_port: Dict[str, SwitchPort], adjacency: Dict[SwitchPair, int]
+                 ) -> Dict[MacPair, List[Path]]:
+    base_stations: List = [node for node in list(graph.nodes) if mac_name.get(node) and mac_name[node][0] == 'B']
+    computing_stations: List = [node for node in list(graph.nodes) if mac_name.get(node) and
+                                (mac_name[node][0] == 'C' or mac_name[node][0] == 'M')]
+
+    all_paths = {}
+    cutoff = len(set(s1 for (s1, s2) in adjacency.keys())) // 3
+    pairs: List[MacPair] = [pair for bs in base_stations for cs in computing_stations for pair in ((bs, cs), (cs, bs))]
+    if PATHS_WORKERS > 1:
+        with Pool(PATHS_WORKERS, initializer=init_paths_worker, initargs=(graph, )) as pool:
+            pair_paths = pool.starmap(pair_candidate_paths, [(src, dst, cutoff) for (src, dst) in pairs])
+    else:
+        pair_paths = [candidate_paths(graph, src, dst, cutoff) for (src, dst) in pairs]
+    for pair, paths in zip(pairs, pair_paths):
+        all_paths[pair] = paths
+
+    for bs_cs_path_list in all_paths.values():
+        for path_idx, path in enumerate(bs_cs_path_list):
+            installable_path: Path = []
+            (switch, in_port) = host_switch_port[path[0]]
+            if len(path) == 3:  # only goes through one switch
+                out_port: int = host_switch_port[path[2]][1]
+                installable_path.append((switch, in_port, out_port))
+            else:
+                out_port: int = adjacency[path[1], path[2]]
+                installable_path.append((switch, in_port, out_port))
+                for i in range(1, len(path) - 3):
+                    section: List[Union[str, int]] = path[i:i + 3]
+                    switch: int = section[1]
+                    in_port: int = adjacency[switch, section[0]]
+                    out_port: int = adjacency[switch, section[2]]
+                    installable_path.append((switch, in_port, out_port))
+                (switch, out_port) = host_switch_port[path[-1]]
+                in_port: int = adjacency[path[-2], path[-3]]
+                installable_path.append((switch, in_port, out_port))
+            bs_cs_path_list[path_idx] = installable_path
+    return all_paths
+
+
+def topology_hash(file: str) -> str:
+    with open(file, 'rb') as topology:
+        return hashlib.sha256(topology.read() + f'PATHS={PATHS},ENUMERATION={PATHS_ENUMERATION},FORMAT={PATHS_CACHE_FORMAT}'.encode('utf-8')
+                              ).hexdigest()[:16]
+
+
+def load_paths(file: str
+               ) -> (Dict[str, str], Dict[str, str], Dict[str, SwitchPort], Dict[SwitchPair, int], Dict[SwitchPair, float], nx.Graph,
+                     Dict[MacPair, List[Path]]):
+    cache: str = f'{PATHS_CACHE}/{topology_hash(file)}.pickle'
+    try:
+        with open(cache, 'rb') as f:
+            mac_name, ip_mac, host_switch_port, adjacency, link_bw, graph, paths = pickle.load(f)
+        return mac_name, ip_mac, host_switch_port, defaultdict(lambda: 0, adjacency), link_bw, graph, paths
+    except Exception as error:  # missing, truncated or written by other code, build it again
+        if not isinstance(error, FileNotFoundError):
+            print(f"Ignoring paths cache {cache}: {error!r}")
+
+    mac_name, ip_mac, host_switch_port, adjacency, link_bw, graph = load_topology(file)
+    paths: Dict[MacPair, List[Path]] = create_paths(graph, mac_name, host_switch_port, adjacency)
+
+    os.makedirs(PATHS_CACHE, exist_ok=True)
+    with open(f'{cache}.{os.getpid()}', 'wb') as f:  # write then rename, so readers never see half a file
+        pickle.dump((mac_name, ip_mac, host_switch_port, dict(adjacency), link_bw, graph, paths), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(f'{cache}.{os.getpid()}', cache)
+    return mac_name, ip_mac, host_switch_port, adjacency, link_bw, graph, paths
+
+
+def get_paths_bottlenecks(graph: nx.Graph, paths: Dict[MacPair, List[Path]]) -> Dict[MacPair, List[float]]:
+    bottlenecks: Dict[MacPair, Union[List[None], List[float]]] = defaultdict(lambda: PATHS * [0.0])
+    for (src, dst), path_list in paths.items():
+        for path_idx, path in enumerate(path_list):
+            switches = [switch for (switch, in_port, out_port) in path]
+            if len(switches) > 1:
+                pairs = [(switches[i], switches[i + 1]) for i in range(len(switches) - 1)]
+                bottlenecks[src, dst][path_idx] = min(graph.get_edge_data(*pair)['weight'] for pair in pairs)
+            else:
+                bottlenecks[src, dst][path_idx] = 1000000.0
+    return bottlenecks
+
+
+def select_best_paths(paths: Dict[MacPair, List[Path]], bottlenecks: Dict[MacPair, List[float]], active_paths: Dict[MacPair, int]
+                      ) -> (Dict[MacPair, Path], Dict[MacPair, int]):
+    best_paths: Dict[MacPair, Path] = {}
+    paths_in_use: Dict[MacPair, int] = active_paths.copy()
+    for (src, dst), path_list in paths.items():
+        if paths_in_use[src, dst] != -1:  # if a path is in use, don't change it
+            best_paths[src, dst] = paths[src, dst][paths_in_use[src, dst]]
+        else:
+            best_bottleneck: float = float("-Inf")
+            for path_idx, path in enumerate(path_list):
+                if bottlenecks[src, dst][path_idx] > best_bottleneck:
+                    best_bottleneck = bottlenecks[src, dst][path_idx]
+                    best_paths[src, dst] = path
+                    paths_in_use[src, dst] = path_idx
+    return best_paths, paths_in_use
+
+
+class PathIndex:  # path-to-link incidence, so bottlenecks are one min-reduction over the links that changed
+    def __init__(self, graph: nx.Graph, paths: Dict[MacPair, List[Path]]) -> None:
+        self.pairs: List[MacPair] = list(paths.keys())
+        self.pair_row: Dict[MacPair, int] = {pair: row for row, pair in enumerate(self.pairs)}
+        self.links: Dict[SwitchPair, int] = {}
+
+        path_links: List[List[int]] = []
+        weights: List[float] = []
+        fixed: np.ndarray = np.full((len(self.pairs), PATHS), 0.0)  # pairs with less than PATHS paths keep 0.0
+        for row, pair in enumerate(self.pairs):
+            for path_idx in range(PATHS):
+                links: List[int] = []
+                if path_idx < len(paths[pair]):
+                    switches = [switch for (switch, in_port, out_port) in paths[pair][path_idx]]
+                    for i in range(len(switches) - 1):
+                        link: SwitchPair = (min(switches[i], switches[i + 1]), max(switches[i], switches[i + 1]))
+                        if link not in self.links:
+                            self.links[link] = len(weights)
+                            weights += [graph.get_edge_data(*link)['weight']]
+                        links += [self.links[link]]
+                    fixed[row, path_idx] = np.nan if links else 1000000.0
+                path_links += [links]
+
+        hops: int = max((len(links) for links in path_links), default=0)
+        self.weights: np.ndarray = np.append(np.array(weights, dtype=np.float64), np.inf)  # last entry pads shorter paths
+        self.path_links: np.ndarray = np.full((len(path_links), max(hops, 1)), len(weights), dtype=np.int64)
+        for path_row, links in enumerate(path_links):
+            self.path_links[path_row, :len(links)] = links
+        self.link_paths: List[np.ndarray] = [np.flatnonzero((self.path_links == link).any(axis=1)) for link in range(len(weights))]
+
+        self.fixed: np.ndarray = fixed.ravel()
+        self.computed: np.ndarray = np.isnan(self.fixed)
+        self.bottlenecks: np.ndarray = self.fixed.copy()
+        self.recompute(np.flatnonzero(self.computed))
+
+    def __getitem__(self, pair: MacPair) -> np.ndarray:  # same lookups as the get_paths_bottlenecks dict
+        row: int = self.pair_row[pair] * PATHS
+        return self.bottlenecks[row:row + PATHS]
+
+    def recompute(self, path_rows: np.ndarray) -> None:
+        self.bottlenecks[path_rows] = self.weights[self.path_links[path_rows]].min(axis=1)
+
+    def link_ids(self, pairs: List[SwitchPair]) -> np.ndarray:  # -1 for links no candidate path crosses
+        return np.array([self.links.get((min(src, dst), max(src, dst)), -1) for (src, dst) in pairs], dtype=np.int64)
+
+    def update(self, weights: Dict[SwitchPair, float]) -> int:
+        links: np.ndarray = self.link_ids(list(weights.keys()))
+        values: np.ndarray = np.array(list(weights.values()), dtype=np.float64)
+        return self.update_links(links[links != -1], values[links != -1])
+
+    def update_links(self, links: np.ndarray, weights: np.ndarray) -> int:
+        changed: np.ndarray = np.unique(links[self.weights[links] != weights])
+        self.weights[links] = weights
+        if len(changed):
+            self.recompute(np.unique(np.concatenate([self.link_paths[link] for link in changed])))
+        return len(changed)
+
+    def rows(self, pairs: List[MacPair]) -> np.ndarray:
+        return self.bottlenecks.reshape(len(self.pairs), PATHS)[[self.pair_row[pair] for pair in pairs]]
@@ -1,24 +1,25 @@
 import gym_containernet
+from checkpoint import Checkpointer
+from metrics import append_metrics
+from q_network import build_q_net, train
+from replay_memory import ReplayMemory
+from transition_shards import ShardWriter
 
-from collections import deque
 import copy
 from datetime import datetime
 import numpy as np
 import torch
 import gym
+import os
 import random
+import sys
+from time import perf_counter
 
-from parameters import INPUT_DIM, HL1, HL2, OUTPUT_DIM, GAMMA, EPSILON, LEARNING_RATE
-from parameters import EPOCHS, MEM_SIZE, BATCH_SIZE, SYNC_FREQ
+from parameters import INPUT_DIM, EPSILON, LEARNING_RATE
+from parameters import EPOCHS, BATCH_SIZE, SYNC_FREQ, CHECKPOINT_FREQ, METRICS_FILE, SHARD_DIR
 
 
-q_net = torch.nn.Sequential(
-    torch.nn.Linear(INPUT_DIM, HL1),
-    torch.nn.ReLU(),
-    torch.nn.Linear(HL1, HL2),
-    torch.nn.ReLU(),
-    torch.nn.Linear(HL2, OUTPUT_DIM)
-)
+q_net = build_q_net()
 
 target_net = copy.deepcopy(q_net)
 target_net.load_state_dict(q_net.state_dict())
@@ -28,11 +29,30 @@ optimizer = torch.optim.Adam(q_net.parameters(), lr=LEARNING_RATE)
 
 losses = []
 total_reward_list = []
-replay = deque(maxlen=MEM_SIZE)
+replay = ReplayMemory()
+shards = ShardWriter() if SHARD_DIR else None
+checkpointer = Checkpointer()
+first_epoch = 1
+epsilon = EPSILON  # decays every epoch, the parameter is only the starting value
+
+if '--resume' in sys.argv:
+    checkpoint = checkpointer.resume(replay)
+    if checkpoint:
+        q_net.load_state_dict(checkpoint['model_state_dict'])
+        target_net.load_state_dict(checkpoint['target_state_dict'])
+        optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        epsilon = checkpoint['epsilon']
+        total_reward_list = checkpoint['total_reward_list']
+        random.setstate(checkpoint['random_state'])
+        generator, keys, *rest = checkpoint['numpy_state']
+        np.random.set_state((generator, np.array(keys, dtype=np.uint32), *rest))
+        torch.set_rng_state(checkpoint['torch_state'])
+        first_epoch = checkpoint['epoch'] + 1
+        print(f"Resuming after epoch {checkpoint['epoch']} with {len(replay)} transitions in memory")
 
 env = gym.make('slice-admission-v0')
 
-for i in range(1, EPOCHS + 1):
+for i in range(first_epoch, EPOCHS + 1):
     time = datetime.now().strftime("%d-%m-%Y_%H:%M:%S")
     print(f'\n\n\n{time}\tEpoch {i}:')
     step = 1
@@ -41,65 +61,58 @@ for i in range(1, EPOCHS + 1):
     inelastic_accepted = 0
     elastic_rejected = 0
     inelastic_rejected = 0
-    state = torch.flatten(torch.from_numpy(env.reset().astype(np.float32))).reshape(1, INPUT_DIM)
+    step_time = 0.0
+    update_time = 0.0
+    epoch_losses = len(losses)
+    state = env.reset().astype(np.float32)
     done = False
 
     while not done:
         print(f"Step {step}")
         step += 1
-        qval = q_net(state).data.numpy()
-        if not state[0][0]:
+        qval = q_net(torch.from_numpy(state).reshape(1, INPUT_DIM)).data.numpy()
+        if not state[0]:
             action = 0
         else:
-            action = np.random.randint(0, 2) if random.random() < EPSILON else np.argmax(qval)
+            action = np.random.randint(0, 2) if random.random() < epsilon else np.argmax(qval)
             if action:
-                if int(state[0][0]) == 1:
+                if int(state[0]) == 1:
                     elastic_accepted += 1
-                elif int(state[0][0]) == 2:
+                elif int(state[0]) == 2:
                     inelastic_accepted += 1
             else:
-                if int(state[0][0]) == 1:
+                if int(state[0]) == 1:
                     elastic_rejected += 1
-                elif int(state[0][0]) == 2:
+                elif int(state[0]) == 2:
                     inelastic_rejected += 1
 
+        started = perf_counter()
         next_state, reward, done, _ = env.step(action)
-        next_state = torch.flatten(torch.from_numpy(next_state.astype(np.float32))).reshape(1, INPUT_DIM)
+        step_time += perf_counter() - started
+        next_state = next_state.astype(np.float32)
 
-        replay.append((state, action, reward, next_state, done))
+        replay.push(state, action, reward, next_state, done)
+        if shards:
+            shards.push(state, action, reward, next_state, done)
         state = next_state
 
         if len(replay) > BATCH_SIZE:
-            minibatch = random.sample(replay, BATCH_SIZE)
-            state_batch = torch.cat([s1 for (s1, a, r, s2, d) in minibatch])
-            action_batch = torch.Tensor([a for (s1, a, r, s2, d) in minibatch])
-            reward_batch = torch.Tensor([r for (s1, a, r, s2, d) in minibatch])
-            next_state_batch = torch.cat([s2 for (s1, a, r, s2, d) in minibatch])
-            done_batch = torch.Tensor([d for (s1, a, r, s2, d) in minibatch])
-            Q1 = q_net(state_batch)
-            with torch.no_grad():
-                Q2 = target_net(next_state_batch)
-
-            Y = reward_batch + GAMMA * ((1 - done_batch) * torch.max(Q2, dim=1)[0])
-            X = Q1.gather(dim=1, index=action_batch.long().unsqueeze(dim=1)).squeeze()
-            loss = loss_fn(X, Y.detach())
-            optimizer.zero_grad()
-            loss.backward()
-            losses.append(loss.item())
-            optimizer.step()
+            started = perf_counter()
+            losses.append(train(q_net, target_net, optimizer, loss_fn, replay))
 
             if step % SYNC_FREQ == 0:
                 target_net.load_state_dict(q_net.state_dict())
+            update_time += perf_counter() - started
 
         total_reward += reward
 
-    if EPSILON > 0.1:
-        EPSILON -= (1 / EPOCHS)
+    if epsilon > 0.1:
+        epsilon -= (1 / EPOCHS)
 
     if i % 50 == 0:
         torch.save({
             'epoch': i,
-            'epsilon': EPSILON,
+            'epsilon': epsilon,
             'model_state_dict': q_net.state_dict(),
             'target_state_dict': target_net.state_dict(),
         }, f'models/{time}.pth')
@@ -109,8 +122,26 @@ for i in range(1, EPOCHS + 1):
     print(f'Accepted:\nElastic: {elastic_accepted}\tInelastic: {inelastic_accepted}\n')
     print(f'Rejected:\nElastic: {elastic_rejected}\tInelastic: {inelastic_rejected}\n')
 
-    with open('rewards.txt', 'a') as results_file:
-        results_file.write(f'{total_reward}\n')
-    with open('accepted.txt', 'a') as accepted_file:
-        accepted_file.write(f'{elastic_accepted}\t{inelastic_accepted}\t'
-                            f'{elastic_rejected}\t{inelastic_rejected}\n')
+    append_metrics(epoch=i, reward=total_reward, elastic_accepted=elastic_accepted, inelastic_accepted=inelastic_accepted,
+                   elastic_rejected=elastic_rejected, inelastic_rejected=inelastic_rejected,
+                   loss=np.mean(losses[epoch_losses:]) if len(losses) > epoch_losses else np.nan,
+                   step_time=step_time / (step - 1), update_time=update_time / max(len(losses) - epoch_losses, 1))
+
+    if i % CHECKPOINT_FREQ == 0:
+        generator, keys, *rest = np.random.get_state()
+        checkpointer.save({
+            'epoch': i,
+            'epsilon': epsilon,
+            'model_state_dict': q_net.state_dict(),
+            'target_state_dict': target_net.state_dict(),
+            'optimizer_state_dict': optimizer.state_dict(),
+            'total_reward_list': total_reward_list,
+            'random_state': random.getstate(),
+            'numpy_state': (generator, keys.tolist(), *rest),
+            'torch_state': torch.get_rng_state(),
+            'files': {METRICS_FILE: os.path.getsize(METRICS_FILE)},
+        }, replay)
+
+checkpointer.close()
+if shards:
+    shards.flush()
@@ -1,21 +1,35 @@
-from topology_manager import TopologyManager, DOCKER_VOLUME
+from fluid_backend import FluidBackend
+from iperf_monitor import IperfMonitor, iperf_duration, summarize_iperf
+from slice_registry import SliceRegistry, connection_index
+from instrumentation import Profiler
+from episode_trace import TraceRecorder
+from protocol import BOTTLENECKS_FRAME, PATHS_FRAME, PATHS_DELTA_FRAME, PATHS_ACK_FRAME, PATHS_NACK_FRAME
+from protocol import SLICE_STARTED_FRAME, recv_frame, send_frame
 
 from bisect import bisect_left
 from gym import Env
 from gym.spaces import Box, Discrete
+from heapq import heapify, heappop, heappush
+from itertools import count
 import json
 import numpy as np
 from queue import Queue
 import random
 import socket
-from sys import byteorder
-from threading import Thread
+from threading import Lock, Thread
 from time import sleep, time
-from typing import Dict, List
+from typing import Dict, List, Tuple, Union
 
+from parameters import BACKEND, DOCKER_VOLUME, BASE_STATION_NAMES, COMPUTING_STATION_NAMES
 from parameters import BASE_STATIONS, COMPUTING_STATIONS, PATHS, CONNECTIONS_OFFSET, INPUT_DIM, OUTPUT_DIM
 from parameters import ELASTIC_ARRIVAL_AVERAGE, INELASTIC_ARRIVAL_AVERAGE, DURATION_AVERAGE, CONNECTIONS_AVERAGE
-from parameters import MAX_REQUESTS, STARTUP_TIME, LOG_TIMEOUT, PORT_RANGE
+from parameters import MAX_REQUESTS, STARTUP_TIME, LOG_TIMEOUT, PATHS_ACK_TIMEOUT, IPERF_JSON_STREAM, TIME_SCALE
+from parameters import PROFILE_FILE, TRACE_FILE, EPISODE_TRACE_DIR
+
+
+# Fluid backend events
+ARRIVAL: int = 0
+DEPARTURE: int = 1
 
 
 def read_templates(file: str) -> (List[Dict], List[Dict]):
@@ -32,16 +46,12 @@ def read_templates(file: str) -> (List[Dict], List[Dict]):
 
 
 def slice_connections_from_array(connections: List) -> (List[str], List[str]):
-    parsed_connections = [connections[i:i + COMPUTING_STATIONS] for i in range(0, len(connections), COMPUTING_STATIONS)]
-
     clients: List[str] = []
     servers: List[str] = []
-    for bs_idx, base_station in enumerate(parsed_connections):
-        for cs_idx, connected in enumerate(base_station):
-            if connected:
-                clients += [f'BS{bs_idx + 1}']
-                servers += [f'{"MECS" if cs_idx < COMPUTING_STATIONS // 2 else "CS"}'
-                            f'{cs_idx + 1 if (cs_idx < COMPUTING_STATIONS // 2) else (cs_idx - COMPUTING_STATIONS // 2 + 1)}']
+    for idx in np.flatnonzero(connections):
+        bs_idx, cs_idx = divmod(int(idx), COMPUTING_STATIONS)
+        clients += [BASE_STATION_NAMES[bs_idx]]
+        servers += [COMPUTING_STATION_NAMES[cs_idx]]
     return clients, servers
 
 
@@ -67,14 +77,14 @@ def json_from_log(client: str, server: str, port: int) -> Dict:
             with open(f"{DOCKER_VOLUME}/{client}_{server}_{port}.log", 'r') as f:
                 data = json.load(f)
         except (FileNotFoundError, json.decoder.JSONDecodeError):
-            sleep(0.2)
+            sleep(0.2 * TIME_SCALE)
         current_time = time()
     return data
 
 
 def evaluate_elastic_slice(bw: float, full_price: float, data: List[Dict]) -> float:
-    averages: List[float] = [connection["end"]["streams"][0]["receiver"]["bits_per_second"] / 1000000.0 for connection in data]
-    total_average: float = sum(averages) / len(averages)
+    averages: List[float] = [connection["average"] for connection in data]
+    total_average: float = sum(averages) / len(averages) if averages else 0.0  # no log at all counts as a failed slice
     if total_average >= bw - bw * .1:
         print(f"Finished elastic slice {total_average} >= {bw}")
         return 0.0
@@ -83,7 +93,7 @@ def evaluate_elastic_slice(bw: float, full_price: float, data: List[Dict]) -> fl
 
 
 def evaluate_inelastic_slice(bw: float, price: float, data: List[Dict]) -> float:
-    worst: float = min(interval["streams"][0]["bits_per_second"] / 1000000.0 for connection in data for interval in connection["intervals"])
+    worst: float = min((connection["worst"] for connection in data), default=0.0)
     if worst >= bw - bw * .1:
         print(f"Finished inelastic slice {worst} >= {bw}")
         return 0.0
@@ -92,8 +102,15 @@ def evaluate_inelastic_slice(bw: float, price: float, data: List[Dict]) -> float
 
 
 class SliceAdmissionEnv(Env):
-    def __init__(self):
-        self.backend: TopologyManager = TopologyManager()
+    def __init__(self, backend: str = BACKEND):
+        self.simulated: bool = backend == 'fluid'
+        self.profiler: Profiler = Profiler(trace=bool(TRACE_FILE))
+        self.recorder: Union[TraceRecorder, None] = TraceRecorder(EPISODE_TRACE_DIR) if EPISODE_TRACE_DIR else None
+        if self.simulated:
+            self.backend: FluidBackend = FluidBackend()
+        else:  # Containernet is only needed, and only imported, for the emulated backend
+            from topology_manager import TopologyManager
+            self.backend: TopologyManager = TopologyManager()
 
         low = np.zeros(INPUT_DIM, dtype=np.float32)
         high = np.array([2.0, 60.0, 100.0, 2.0] + [1.0] * BASE_STATIONS * COMPUTING_STATIONS +
@@ -111,17 +128,28 @@ class SliceAdmissionEnv(Env):
         self.elastic_generator = None
         self.inelastic_generator = None
         self.evaluators: List[Thread] = []
+        self.events: List[Tuple] = []  # (time, id, kind, payload) heap, only used by the fluid backend
+        self.event_ids = count()
 
         self.elastic_request_templates: List[Dict] = []
         self.inelastic_request_templates: List[Dict] = []
         self.elastic_request_templates, self.inelastic_request_templates = read_templates("request_templates.txt")
 
-        self.active_ports: List[int] = []
-        self.active_connections: List[str] = []
-        self.active_paths: List[int] = BASE_STATIONS * COMPUTING_STATIONS * [-1]
-        self.bottlenecks: List[float] = []
+        self.registry: SliceRegistry = SliceRegistry()
+        self.paths_sequence: int = 0
+        self.paths_lock: Lock = Lock()  # keeps path frames in sequence order across evaluator threads
+        self.bottlenecks: np.ndarray = np.zeros(BASE_STATIONS * COMPUTING_STATIONS * PATHS, dtype=np.float32)
+
+        self.iperf_monitor: Union[IperfMonitor, None] = None
+        if self.simulated:
+            self.bottlenecks = self.backend.bottlenecks
+            return
+
+        if IPERF_JSON_STREAM:
+            self.iperf_monitor = IperfMonitor(DOCKER_VOLUME)
+            self.iperf_monitor.start()
 
-        self.paths_socket: socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.paths_socket: Union[socket.socket, None] = None
 
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as bottlenecks_socket:
             bottlenecks_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -130,35 +158,69 @@ class SliceAdmissionEnv(Env):
             self.bottlenecks_connection, _ = bottlenecks_socket.accept()
             Thread(target=self.receive_bottlenecks).start()
 
-        sleep(STARTUP_TIME)  # give the controller time to build starting paths
+        sleep(STARTUP_TIME * TIME_SCALE)  # give the controller time to build starting paths
+        self.connect_paths()
+
+    def connect_paths(self) -> None:
+        self.paths_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.paths_socket.connect(('127.0.0.1', 6655))
+        self.paths_socket.settimeout(PATHS_ACK_TIMEOUT)
 
     def reset(self) -> object:
-        self.backend.clear_logs()
+        if PROFILE_FILE:  # spans of the episode that just ended
+            self.profiler.export(PROFILE_FILE)
+        if TRACE_FILE:
+            self.profiler.export_trace(TRACE_FILE)
+        if self.simulated:
+            self.backend.reset()
+            self.bottlenecks = self.backend.bottlenecks
+        else:
+            self.backend.clear_logs()
+            if self.iperf_monitor:
+                self.iperf_monitor.clear()
         self.state = np.zeros(INPUT_DIM, dtype=np.float32)
 
         self.requests = 0
         self.requests_queue = Queue(maxsize=MAX_REQUESTS)
         self.departed_queue = Queue(maxsize=MAX_REQUESTS)
 
-        self.active_ports = []
-        self.active_paths = BASE_STATIONS * COMPUTING_STATIONS * [-1]
-        self.active_connections = []
+        self.registry.reset()
+        if self.recorder:
+            self.recorder.reset()
 
         self.generator_semaphore = True
-        self.elastic_generator = Thread(target=self.request_generator, args=(1, ))
-        self.inelastic_generator = Thread(target=self.request_generator, args=(2, ))
-        self.elastic_generator.start()
-        self.inelastic_generator.start()
         self.evaluators = []
+        self.events = []
+        if self.simulated:
+            self.schedule_arrival(1)
+            self.schedule_arrival(2)
+        else:
+            self.elastic_generator = Thread(target=self.request_generator, args=(1, ))
+            self.inelastic_generator = Thread(target=self.request_generator, args=(2, ))
+            self.elastic_generator.start()
+            self.inelastic_generator.start()
 
         self.send_paths()
-        self.state_from_request(self.requests_queue.get(block=True))
+        self.state_from_request(self.next_request())
+        if self.recorder:
+            self.recorder.state(self.state, now=self.backend.now if self.simulated else None)
 
         # print(self.state)
         return self.state
 
-    def step(self, action) -> (object, float, bool, dict):
+    def step(self, action) -> (object, float, bool, dict):  # info["timings"]: seconds spent in each span during this step
+        if self.recorder:
+            self.recorder.decision(int(action))
+        with self.profiler.collect() as timings:
+            with self.profiler.span('step'):
+                state, reward, done, info = self.take_action(action)
+        if self.recorder and not done:
+            self.recorder.state(state, reward, self.backend.now if self.simulated else None)
+        elif self.recorder:
+            self.recorder.write()
+        return state, reward, done, dict(info, timings=timings)
+
+    def take_action(self, action) -> (object, float, bool, dict):
         reward: float = 0.0
         done: bool = False
 
@@ -166,7 +228,8 @@ class SliceAdmissionEnv(Env):
             self.requests += 1
             if action:
                 print(f"ACCEPT")
-                self.create_slice(*slice_connections_from_array(self.state[4:CONNECTIONS_OFFSET]))
+                with self.profiler.span('create_slice'):
+                    self.create_slice(*slice_connections_from_array(self.state[4:CONNECTIONS_OFFSET]))
                 if self.state[0] == 1:  # elastic slice
                     self.state[CONNECTIONS_OFFSET] += 1
                 elif self.state[0] == 2:  # inelastic slice
@@ -176,22 +239,27 @@ class SliceAdmissionEnv(Env):
                 print("REJECT")
 
         if self.requests < MAX_REQUESTS:
-            self.state_from_request(self.requests_queue.get(block=True))
+            self.state_from_request(self.next_request())
             if self.state[0] == 0:  # slice departure
-                departure = self.departed_queue.get()
+                departure = self.next_departure()
                 self.state[CONNECTIONS_OFFSET + departure["type"] - 1] -= 1
                 reward += departure["reward"]
         else:
             if self.generator_semaphore:
                 self.stop_generators()
+            if self.simulated and self.events:
+                self.next_request()
+                reward += self.state_from_departure(self.next_departure())
+                return self.state, reward, done, {}
             for evaluator in self.evaluators:
                 if evaluator.is_alive():  # might get stuck if a second evaluator finishes before this one
-                    evaluator.join()
-                    reward += self.state_from_departure(self.departed_queue.get())
+                    with self.profiler.span('evaluator_join'):
+                        evaluator.join()
+                    reward += self.state_from_departure(self.next_departure())
                     # print(self.state)
                     return self.state, reward, done, {}
             while not self.departed_queue.empty():  # prevent the previous error
-                reward += self.state_from_departure(self.departed_queue.get())
+                reward += self.state_from_departure(self.next_departure())
                 # print(self.state)
                 return self.state, reward, done, {}
             done = True
@@ -204,23 +272,56 @@ class SliceAdmissionEnv(Env):
 
     def receive_bottlenecks(self) -> None:
         while True:
-            bottlenecks = []
-            size = int.from_bytes(self.bottlenecks_connection.recv(16), byteorder=byteorder)
             try:
-                data = self.bottlenecks_connection.recv(size).decode('utf-8').split('\n')[:-1]
-                if len(data) == BASE_STATIONS * COMPUTING_STATIONS:
-                    for line in data:
-                        bottlenecks += [float(bottleneck) for bottleneck in line.split(',')]
-                    self.bottlenecks = bottlenecks
-            except OverflowError:
-                print("\n\n\n\n\n\t\t\t\t\t\t\t\tOVERFLOW ERROR\n\n\n\n\n")
-            except MemoryError:
-                print("\n\n\n\n\n\t\t\t\t\t\t\t\tMEMORY ERROR\n\n\n\n\n")
-
-    def send_paths(self) -> None:
-        data: str = ','.join(str(path) for path in self.active_paths)
-        self.paths_socket.sendall(len(data).to_bytes(16, byteorder))
-        self.paths_socket.sendall(data.encode('utf-8'))
+                kind, _, bottlenecks = recv_frame(self.bottlenecks_connection)
+                if kind == BOTTLENECKS_FRAME and len(bottlenecks) == BASE_STATIONS * COMPUTING_STATIONS * PATHS:
+                    self.bottlenecks = bottlenecks  # float32 view of the frame, copied into the state on the next request
+            except ValueError as error:
+                print(f"\n\n\n\n\n\t\t\t\t\t\t\t\tPROTOCOL ERROR: {error}\n\n\n\n\n")
+            except ConnectionError:
+                return
+
+    def send_paths(self, connections: List[int] = None) -> None:  # only the given connections changed, None sends everything
+        with self.profiler.span('send_paths'), self.paths_lock:
+            self.paths_sequence += 1
+            paths: List[int] = self.registry.paths(connections)
+            changes: List[Tuple[int, int]] = list(zip(connections if connections is not None else range(len(paths)), paths))
+
+            if self.recorder:
+                self.recorder.paths_changed(changes)
+            if self.simulated:
+                self.backend.update_paths(changes)
+            else:
+                if connections is None:
+                    send_frame(self.paths_socket, PATHS_FRAME, np.array(paths, dtype=np.int16), self.paths_sequence)
+                else:
+                    send_frame(self.paths_socket, PATHS_DELTA_FRAME, np.array(changes, dtype=np.int32).ravel(), self.paths_sequence)
+                with self.profiler.span('paths_ack'):
+                    if not self.wait_paths_installed(self.paths_sequence):
+                        self.resync_paths()
+
+    def wait_paths_installed(self, sequence: int) -> bool:  # traffic should only start once the flow rules are in place
+        try:
+            while True:
+                kind, acknowledged, _ = recv_frame(self.paths_socket)
+                if kind == PATHS_ACK_FRAME and acknowledged >= sequence:
+                    return True
+                if kind == PATHS_NACK_FRAME and acknowledged == sequence:
+                    print(f"Paths frame {sequence} dropped by the controller")
+                    return False
+        except socket.timeout:  # part of a frame may have been read, the stream can only be trusted again after reconnecting
+            print(f"Paths frame {sequence} not confirmed after {PATHS_ACK_TIMEOUT} s")
+        except ValueError as error:
+            print(f"\n\n\n\n\n\t\t\t\t\t\t\t\tPROTOCOL ERROR: {error}\n\n\n\n\n")
+        self.paths_socket.close()
+        self.connect_paths()
+        return False
+
+    def resync_paths(self) -> None:  # a full snapshot, the controller applies deltas on top of it again
+        self.paths_sequence += 1
+        send_frame(self.paths_socket, PATHS_FRAME, np.array(self.registry.paths(), dtype=np.int16), self.paths_sequence)
+        if not self.wait_paths_installed(self.paths_sequence):
+            print(f"Paths snapshot {self.paths_sequence} not installed, the next paths frame retries")
 
     def state_from_request(self, request: Dict) -> None:
         self.state[0] = request["type"]
@@ -230,6 +331,12 @@ class SliceAdmissionEnv(Env):
         self.state[4:CONNECTIONS_OFFSET] = request["connections"]
         self.state[CONNECTIONS_OFFSET + 2:] = self.bottlenecks
 
+    def next_departure(self) -> Dict:
+        departure: Dict = self.departed_queue.get()
+        if self.recorder:
+            self.recorder.departed(departure["slice"])
+        return departure
+
     def state_from_departure(self, departure: Dict) -> float:
         self.state[:CONNECTIONS_OFFSET] = np.zeros(4 + BASE_STATIONS * COMPUTING_STATIONS, dtype=np.float32)
         self.state[CONNECTIONS_OFFSET + departure["type"] - 1] -= 1
@@ -238,29 +345,45 @@ class SliceAdmissionEnv(Env):
 
     def create_slice(self, clients: List[str], servers: List[str]) -> None:
         ports: List[int] = []
+        changed: List[int] = []
         for (client, server) in zip(clients, servers):
-            connection_idx: int = (int(client[2:]) - 1) * COMPUTING_STATIONS + \
-                                  (int(server[4:]) - 1 if server[0] == 'M' else int(server[2:]) + BASE_STATIONS - 1)
-            bottleneck_idx: int = connection_idx * BASE_STATIONS
-            self.active_paths[connection_idx] = np.argmax(self.bottlenecks[bottleneck_idx:bottleneck_idx + PATHS]) \
-                if self.active_paths[connection_idx] == -1 else self.active_paths[connection_idx]
+            connection_idx: int = connection_index(client, server)
+            if self.registry.acquire(connection_idx, self.bottlenecks):
+                changed += [connection_idx]
 
-        self.send_paths()
+        if changed:
+            self.send_paths(changed)
 
         for (client, server) in zip(clients, servers):
-            port: int = random.choice([port for port in range(*PORT_RANGE) if port not in self.active_ports])
+            port: int = self.registry.allocate_port()
             ports += [port]
-            self.active_ports += [port]
-            self.active_connections += [f'{client}_{server}_{port}']
-            self.backend.slice(client, server, port, self.state[1], self.state[2])
-
-        evaluator = Thread(target=self.slice_evaluator,
-                           args=(clients, servers, ports, self.state[0], self.state[1], self.state[2], self.state[1] * self.state[3]))
+            if self.iperf_monitor:
+                self.iperf_monitor.expect(f'{client}_{server}_{port}', iperf_duration(self.state[1]))
+            with self.profiler.span('start_slice'):
+                self.backend.slice(client, server, port, self.state[1], self.state[2])
+        if self.recorder:
+            self.recorder.admitted(ports)
+        if not self.simulated:  # the controller polls faster while the new traffic settles
+            try:
+                with self.paths_lock:
+                    send_frame(self.paths_socket, SLICE_STARTED_FRAME, np.zeros(0, dtype=np.int16))
+            except OSError:  # only a hint, the next paths frame reconnects if the socket broke
+                pass
+
+        evaluation: Tuple = (clients, servers, ports, self.state[0], self.state[1], self.state[2], self.state[1] * self.state[3])
+        if self.simulated:
+            heappush(self.events, (self.backend.now + int(self.state[1]), next(self.event_ids), DEPARTURE, evaluation))
+            return
+        evaluator = Thread(target=self.slice_evaluator, args=evaluation)
         self.evaluators += [evaluator]
         evaluator.start()
 
     def stop_generators(self) -> None:
         self.generator_semaphore = False
+        if self.simulated:  # drop the pending arrivals, keep the departures
+            self.events = [event for event in self.events if event[2] != ARRIVAL]
+            heapify(self.events)
+            return
         if self.elastic_generator.is_alive():
             self.elastic_generator.join()
         if self.inelastic_generator.is_alive():
@@ -272,45 +395,80 @@ class SliceAdmissionEnv(Env):
 
         while self.generator_semaphore:
             arrival: float = np.random.poisson(ELASTIC_ARRIVAL_AVERAGE if slice_type == 1 else INELASTIC_ARRIVAL_AVERAGE)
-            sleep(arrival)
+            sleep(arrival * TIME_SCALE)
 
             if self.generator_semaphore:  # ensures req isn't created if new req is created while inside loop
-                duration: int = min(max(int(np.random.exponential(DURATION_AVERAGE)), 1), 60)
-                bw, price = random.choice(self.elastic_request_templates if slice_type == 1 else self.inelastic_request_templates)
+                self.requests_queue.put(self.random_request(slice_type))
 
-                number_connections = min(max(int(np.random.exponential(CONNECTIONS_AVERAGE)), 1), BASE_STATIONS)
-                base_stations = random.sample(range(BASE_STATIONS), number_connections)
-                computing_stations = random.sample(range(COMPUTING_STATIONS), number_connections)
+    def random_request(self, slice_type: int) -> Dict:
+        duration: int = min(max(int(np.random.exponential(DURATION_AVERAGE)), 1), 60)
+        bw, price = random.choice(self.elastic_request_templates if slice_type == 1 else self.inelastic_request_templates)
 
-                connections = np.zeros((BASE_STATIONS, COMPUTING_STATIONS), dtype=np.float32)
-                for (bs, cs) in zip(base_stations, computing_stations):
-                    connections[bs][cs] = 1
+        number_connections = min(max(int(np.random.exponential(CONNECTIONS_AVERAGE)), 1), BASE_STATIONS, COMPUTING_STATIONS)
+        base_stations = random.sample(range(BASE_STATIONS), number_connections)
+        computing_stations = random.sample(range(COMPUTING_STATIONS), number_connections)
 
-                self.requests_queue.put(dict(type=slice_type, duration=int(duration), bw=float(bw),
-                                             price=float(price), connections=connections.flatten()))
+        connections = np.zeros((BASE_STATIONS, COMPUTING_STATIONS), dtype=np.float32)
+        for (bs, cs) in zip(base_stations, computing_stations):
+            connections[bs][cs] = 1
+
+        return dict(type=slice_type, duration=int(duration), bw=float(bw), price=float(price), connections=connections.flatten())
+
+    def schedule_arrival(self, slice_type: int) -> None:
+        if self.generator_semaphore:
+            arrival: float = np.random.poisson(ELASTIC_ARRIVAL_AVERAGE if slice_type == 1 else INELASTIC_ARRIVAL_AVERAGE)
+            heappush(self.events, (self.backend.now + arrival, next(self.event_ids), ARRIVAL, slice_type))
+
+    def next_request(self) -> Dict:
+        with self.profiler.span('next_request'):
+            if not self.simulated:
+                return self.requests_queue.get(block=True)
+
+            while self.requests_queue.empty():  # run the fluid model until the next arrival or departure
+                event_time, _, kind, payload = heappop(self.events)
+                self.backend.advance(event_time)
+                self.bottlenecks = self.backend.bottlenecks
+                if kind == ARRIVAL:
+                    self.schedule_arrival(payload)
+                    self.requests_queue.put(self.random_request(payload))
+                else:
+                    with self.profiler.span('evaluate_slice'):
+                        self.evaluate_slice(*payload)
+            return self.requests_queue.get()
 
     def slice_evaluator(self, clients: List[str], servers: List[str], ports: List[int], slice_type: int, duration: int, bw: float, price: float
                         ) -> None:
         if slice_type not in [1, 2]:
             return
 
-        sleep(duration)
+        if not self.iperf_monitor:  # the monitor signals completion itself
+            sleep(iperf_duration(duration))  # iperf3 runs whole seconds, json_from_log waits for the rest
+        with self.profiler.span('evaluate_slice'):
+            self.evaluate_slice(clients, servers, ports, slice_type, duration, bw, price)
 
+    def evaluate_slice(self, clients: List[str], servers: List[str], ports: List[int], slice_type: int, duration: int, bw: float, price: float
+                       ) -> None:
         data: List[Dict] = []
+        released: List[int] = []
         for (client, server, port) in zip(clients, servers, ports):
-            result = json_from_log(client, server, port)
-            if result:
-                data += [result]
+            if self.simulated:
+                result = summarize_iperf(self.backend.results(client, server, port))
+            elif self.iperf_monitor:
+                result = self.iperf_monitor.wait(f'{client}_{server}_{port}', iperf_duration(duration) + LOG_TIMEOUT)
+            else:
+                result = summarize_iperf(json_from_log(client, server, port), iperf_duration(duration))
+            data += [result]
 
-            self.active_connections.remove(f'{client}_{server}_{port}')
-            if not sum(1 for connection in self.active_connections if f'{client}_{server}' in connection):  # if no one else is using this path
-                connection_idx: int = (int(client[2:]) - 1) * COMPUTING_STATIONS + \
-                                      (int(server[4:]) - 1 if server[0] == 'M' else int(server[2:]) + BASE_STATIONS - 1)
-                self.active_paths[connection_idx] = -1
+            connection_idx: int = connection_index(client, server)
+            if self.registry.release(connection_idx):  # if no one else is using this path
+                released += [connection_idx]
 
-        self.send_paths()
+        if released:
+            self.send_paths(released)
 
+        if self.recorder:
+            self.recorder.finished(ports[0], data)
         reward: float = evaluate_elastic_slice(bw, price, data) if slice_type == 1 else evaluate_inelastic_slice(bw, price, data)
-        self.departed_queue.put(dict(type=1 if slice_type == 1 else 2, reward=reward))
+        self.departed_queue.put(dict(type=1 if slice_type == 1 else 2, reward=reward, slice=ports[0]))
         self.requests_queue.put(dict(type=0, duration=0, bw=0.0, price=0.0,
                                      connections=np.zeros(BASE_STATIONS * COMPUTING_STATIONS, dtype=np.float32)))
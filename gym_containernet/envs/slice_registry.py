@@ -0,0 +1,57 @@
+import numpy as np
+import random
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from parameters import BASE_STATION_NAMES, COMPUTING_STATION_NAMES, BASE_STATIONS, COMPUTING_STATIONS, PATHS, PORT_RANGE
+
+
+BASE_STATION_INDEX: Dict[str, int] = {name: idx for idx, name in enumerate(BASE_STATION_NAMES)}
+COMPUTING_STATION_INDEX: Dict[str, int] = {name: idx for idx, name in enumerate(COMPUTING_STATION_NAMES)}
+
+
+def connection_index(client: str, server: str) -> int:
+    return BASE_STATION_INDEX[client] * COMPUTING_STATIONS + COMPUTING_STATION_INDEX[server]
+
+
+class SliceRegistry:  # ports, per-connection users and active paths, shared by create_slice and the evaluators
+    def __init__(self, port_range: Tuple[int, int] = PORT_RANGE) -> None:
+        self.lock: Lock = Lock()
+        self.port_range: Tuple[int, int] = port_range
+        self.free_ports: List[int] = []
+        self.users: List[int] = []
+        self.active_paths: List[int] = []
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.free_ports = list(range(*self.port_range))
+            self.users = BASE_STATIONS * COMPUTING_STATIONS * [0]
+            self.active_paths = BASE_STATIONS * COMPUTING_STATIONS * [-1]
+
+    def allocate_port(self) -> int:  # ports stay taken until reset, their iperf3 servers keep listening
+        with self.lock:
+            idx: int = random.randrange(len(self.free_ports))
+            self.free_ports[idx], self.free_ports[-1] = self.free_ports[-1], self.free_ports[idx]
+            return self.free_ports.pop()
+
+    def acquire(self, connection_idx: int, bottlenecks: np.ndarray) -> bool:  # True if the connection got a new path
+        with self.lock:
+            self.users[connection_idx] += 1
+            if self.active_paths[connection_idx] != -1:
+                return False
+            bottleneck_idx: int = connection_idx * PATHS
+            self.active_paths[connection_idx] = int(np.argmax(bottlenecks[bottleneck_idx:bottleneck_idx + PATHS]))
+            return True
+
+    def release(self, connection_idx: int) -> bool:  # True if nobody else uses the connection's path anymore
+        with self.lock:
+            self.users[connection_idx] -= 1
+            if self.users[connection_idx] > 0:
+                return False
+            self.active_paths[connection_idx] = -1
+            return True
+
+    def paths(self, connections: List[int] = None) -> List[int]:
+        with self.lock:
+            return list(self.active_paths) if connections is None else [self.active_paths[idx] for idx in connections]
@@ -0,0 +1,29 @@
+import networkx as nx
+import random
+import sys
+from typing import List
+
+
+def generate_topology(file: str, switches: int, base_stations: int, computing_stations: int, degree: int = 3,
+                      seed: int = 0) -> None:  # same line format as topology.txt, hosts first
+    rng: random.Random = random.Random(seed)
+    mesh: nx.Graph = nx.connected_watts_strogatz_graph(switches, max(degree - degree % 2, 2), 0.3, seed=seed)
+    extra: int = switches * degree // 2 - len(mesh.edges)
+    while extra > 0:  # odd degrees: random chords on top of the next lower even lattice, which is already connected
+        u, v = rng.randrange(switches), rng.randrange(switches)
+        if u != v and not mesh.has_edge(u, v):
+            mesh.add_edge(u, v)
+            extra -= 1
+
+    hosts: List[str] = [f'BS{idx + 1}' for idx in range(base_stations)]
+    hosts += [f'MECS{idx + 1}' for idx in range(computing_stations // 2)]
+    hosts += [f'CS{idx + 1}' for idx in range(computing_stations - computing_stations // 2)]
+    lines: List[str] = [f'{host}\tS{rng.randrange(switches) + 1}\t1000\t1\t0' for host in hosts]
+    lines += [f'S{u + 1}\tS{v + 1}\t{rng.choice((300, 500, 1000))}\t1\t0' for u, v in sorted(mesh.edges)]
+    with open(file, 'w') as topology:
+        topology.write('\n'.join(lines) + '\n')
+
+
+if __name__ == '__main__':  # python topology_generator.py <scale> [file], scale 1 is the size of topology.txt
+    scale: int = int(sys.argv[1])
+    generate_topology(sys.argv[2] if len(sys.argv) > 2 else f'topology_{scale}x.txt', 64 * scale, 7 * scale, 14 * scale)
@@ -1,33 +1,110 @@
 from mininet.net import Containernet
-from mininet.node import RemoteController, Host, OVSSwitch
+from mininet.node import Docker, RemoteController, Host, OVSSwitch
 from mininet.link import TCLink
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
 from os import system
-from time import sleep
-from typing import Dict, List
+import subprocess
+from time import perf_counter, sleep
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from parameters import TOPOLOGY_FILE, DOCKER_VOLUME
+from parameters import TOPOLOGY_FILE, DOCKER_VOLUME, BRINGUP_WORKERS, PERSISTENT_NETWORK, NETWORK_STAMP, IPERF_JSON_STREAM, TIME_SCALE
+from iperf_monitor import iperf_interval, iperf_seconds
+from layout import read_topology
+from routing import host_ip, int_to_mac
+
+
+@contextmanager
+def timed(phase: str, timings: Dict[str, float]) -> Iterator[None]:
+    start: float = perf_counter()
+    yield
+    timings[phase] = perf_counter() - start
+    print(f"{phase}: {timings[phase]:.2f} s")
+
+
+def topology_digest(file: str) -> str:
+    with open(file, 'rb') as topology:
+        return hashlib.sha256(topology.read()).hexdigest()
+
+
+def command_output(command: List[str]) -> List[str]:
+    try:
+        return subprocess.run(command, capture_output=True, text=True).stdout.split()
+    except OSError:
+        return []
 
 
 class TopologyManager:
     def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+        self.lines, self.hosts, self.switches = read_topology(TOPOLOGY_FILE)
+        self.digest: str = topology_digest(TOPOLOGY_FILE)
+        self.network: Optional[Containernet] = None
+        self.ips: Dict[str, str] = {}
         system('clear')
-        system('sudo mn -c')
+        if PERSISTENT_NETWORK and self.running_network_matches():
+            with timed('reattach', self.timings):
+                self.reattach()
+        else:
+            self.build()
+        print(f"Topology up in {sum(self.timings.values()):.2f} s")
+
+    def build(self) -> None:
+        with timed('cleanup', self.timings):
+            system(f'rm -f {NETWORK_STAMP}')
+            system('sudo mn -c')
+            self.clear_logs()
+        self.network = Containernet(controller=RemoteController, switch=OVSSwitch, link=TCLink,
+                                    autoSetMacs=True, ipBase='10.0.0.0/8')
+        self.load_topology()
+        with timed('start', self.timings):
+            self.network.addController('c0', controller=RemoteController, ip='127.0.0.1', port=6653)
+            self.network.start()
+        with timed('neighbors', self.timings):
+            self.add_arps()
+        self.ips = {host.name: host.IP() for host in self.network.hosts}
+        if PERSISTENT_NETWORK:
+            with open(NETWORK_STAMP, 'w') as stamp:
+                stamp.write(self.digest)
+
+    def running_network_matches(self) -> bool:  # built from this topology file and still up
+        try:
+            with open(NETWORK_STAMP, 'r') as stamp:
+                if stamp.read().strip() != self.digest:
+                    return False
+        except OSError:
+            return False
+        containers: List[str] = command_output(['sudo', 'docker', 'ps', '--format', '{{.Names}}'])
+        bridges: List[str] = command_output(['sudo', 'ovs-vsctl', 'list-br'])
+        return set(f'mn.{host}' for host in self.hosts) <= set(containers) and set(self.switches) <= set(bridges)
+
+    def reattach(self) -> None:  # reset only what a previous run may have left behind
+        self.ips = {host: host_ip(idx + 1) for idx, host in enumerate(self.hosts)}  # same order as add_hosts
+        with ThreadPoolExecutor(max_workers=BRINGUP_WORKERS) as executor:
+            list(executor.map(lambda host: system(f'sudo docker exec mn.{host} pkill iperf3 > /dev/null 2>&1'), self.hosts))
+            # dropping every flow and reconnecting makes the controller install table-miss entries and paths again
+            list(executor.map(lambda switch: system(f'sudo ovs-ofctl -O OpenFlow13 del-flows {switch} && '
+                                                    f'sudo ovs-vsctl set-controller {switch} tcp:127.0.0.1:6653'), self.switches))
         self.clear_logs()
-        self.network: Containernet = Containernet(controller=RemoteController, switch=OVSSwitch, link=TCLink,
-                                                  autoSetMacs=True, ipBase='10.0.0.0/8')
-        self.load_topology(TOPOLOGY_FILE)
-        self.network.addController('c0', controller=RemoteController, ip='127.0.0.1', port=6653)
-        self.network.start()
-        self.add_arps()
 
     def clear_logs(self) -> None:
         system(f'rm -f {DOCKER_VOLUME}/*.log')
 
-    def add_host(self, name: str) -> None:
-        if name not in self.network.keys():
-            system(f'sudo docker rm -f mn.{name}')
-            self.network.addDocker(name=name, dimage='iperf:latest', volumes=[f'{DOCKER_VOLUME}:/home/volume'])
+    def add_hosts(self, names: List[str]) -> None:  # containers are created concurrently, addresses follow file order
+        names = [name for name in names if name not in self.network.keys()]
+        if not names:
+            return
+        system(f'sudo docker rm -f {" ".join(f"mn.{name}" for name in names)} > /dev/null 2>&1')
+        first: int = self.network.nextIP
+        addresses: List[Dict] = [dict(ip=f'{host_ip(first + idx)}/8', mac=int_to_mac(first + idx).lower()) for idx in range(len(names))]
+        with ThreadPoolExecutor(max_workers=BRINGUP_WORKERS) as executor:  # only the docker create and start run in parallel
+            containers: List[Docker] = list(executor.map(
+                lambda idx: Docker(names[idx], dimage='iperf:latest', volumes=[f'{DOCKER_VOLUME}:/home/volume'], **addresses[idx]),
+                range(len(names))))
+        for name, container, address in zip(names, containers, addresses):  # Containernet's bookkeeping is not thread-safe
+            self.network.addDocker(name, cls=lambda *args, **params: container, **address)
 
     def add_switch(self, name: str) -> None:
         if name not in self.network.keys():
@@ -37,28 +114,35 @@ class TopologyManager:
         if not self.network.linksBetween(self.network.get(source), self.network.get(destination)):
             self.network.addLink(self.network.get(source), self.network.get(destination), **link_options)
 
-    def load_topology(self, file: str) -> None:
-        with open(file, 'r') as topology:
-            for line in topology.readlines():
-                cols: List[str] = line.split()
+    def load_topology(self) -> None:
+        with timed('containers', self.timings):
+            self.add_hosts(self.hosts)
+        with timed('links', self.timings):
+            for cols in self.lines:
                 for node in cols[:2]:
                     if node[0] == 'S':
                         self.add_switch(node)
-                    else:
-                        self.add_host(node)
                 link_options: Dict = dict(bw=int(cols[2]), delay=f'{cols[3]}ms', loss=float(cols[4]))
                 self.add_link(cols[0], cols[1], link_options)
 
-    def add_arps(self) -> None:
-        for src_idx, src in enumerate(self.network.hosts):
-            for dst_idx, dst in enumerate(self.network.hosts):
-                if src_idx != dst_idx:
-                    src.cmd(f'arp -s {dst.IP()} {dst.MAC()}')
+    def add_arps(self) -> None:  # one shell round trip per host, hosts in parallel
+        neighbors: List[Tuple[str, str]] = [(host.IP(), host.MAC()) for host in self.network.hosts]
+
+        def add_neighbors(src: Host) -> None:
+            src.cmd('; '.join(f'arp -s {ip} {mac}' for (ip, mac) in neighbors if ip != src.IP()))
+
+        with ThreadPoolExecutor(max_workers=BRINGUP_WORKERS) as executor:
+            list(executor.map(add_neighbors, self.network.hosts))
+
+    def run(self, name: str, command: str) -> None:  # in the background, through docker when reattached
+        if self.network:
+            self.network.get(name).cmd(f'{command} &')
+        else:
+            system(f'sudo docker exec -d mn.{name} bash -c "{command}"')
 
     def slice(self, source: str, destination: str, port: int, duration: int, bw: float) -> None:
-        src: Host = self.network.get(source)
-        dst: Host = self.network.get(destination)
-        if src and dst:
-            dst.cmd(f'iperf3 -s -p {port} -i 1 &')
-            src.cmd(f'iperf3 -c {dst.IP()} -p {port} -t {duration} -b {bw}M -J >& /home/volume/{source}_{destination}_{port}.log &')
-            sleep(1)
+        if source in self.ips and destination in self.ips:
+            self.run(destination, f'iperf3 -s -p {port} -i {iperf_interval()}')
+            self.run(source, f'iperf3 -c {self.ips[destination]} -p {port} -t {iperf_seconds(duration)} -i {iperf_interval()} '
+                             f'-b {bw}M -J {"--json-stream " if IPERF_JSON_STREAM else ""}>& /home/volume/{source}_{destination}_{port}.log')
+            sleep(TIME_SCALE)
@@ -0,0 +1,104 @@
+from q_network import build_q_net, train
+from replay_memory import BOTTLENECKS_OFFSET, ReplayMemory, bottleneck_scale, decode_states
+
+import copy
+from datetime import datetime
+from glob import glob
+import numpy as np
+import os
+import sys
+import torch
+from typing import List, Tuple
+
+from parameters import INPUT_DIM, LEARNING_RATE, SYNC_FREQ
+from parameters import SHARD_DIR, SHARD_SIZE, OFFLINE_UPDATES
+
+
+class ShardWriter:  # streams transitions into fixed-size .npy shards, same records as the replay memory
+    def __init__(self, directory: str = SHARD_DIR, size: int = SHARD_SIZE) -> None:
+        self.prefix: str = f'{directory}/shard_{datetime.now().strftime("%Y%m%d_%H%M%S")}_{os.getpid()}'
+        self.buffer: ReplayMemory = ReplayMemory(size, file='')
+        self.shards: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def push(self, state: np.ndarray, action: int, reward: float, next_state: np.ndarray, done: bool) -> None:
+        self.buffer.push(state, action, reward, next_state, done)
+        if self.buffer.position == 0:
+            self.flush()
+
+    def flush(self) -> None:  # the last shard of a run may be shorter
+        if not len(self.buffer):
+            return
+        file: str = f'{self.prefix}_{self.shards:05d}.npy'
+        with open(f'{file}.tmp', 'wb') as shard:
+            np.save(shard, self.buffer.memory[:len(self.buffer)])
+        os.replace(f'{file}.tmp', file)
+        self.shards += 1
+        self.buffer.position, self.buffer.size = 0, 0
+
+
+class ShardDataset:  # memory-maps every shard in a directory, sampling only reads the sampled records
+    def __init__(self, directory: str = SHARD_DIR) -> None:
+        self.directory: str = directory
+        self.files: List[str] = []
+        self.shards: List[np.ndarray] = []
+        self.scales: List[float] = []
+        self.ends: np.ndarray = np.zeros(0, dtype=np.int64)
+        self.batch: Tuple[np.ndarray, ...] = ()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    def refresh(self) -> int:  # maps shards written since the last call, returns how many
+        added: int = 0
+        for file in sorted(set(glob(f'{self.directory}/*.npy')) - set(self.files)):
+            shard: np.ndarray = np.load(file, mmap_mode='r')
+            if shard.dtype['state']['bottlenecks'].shape[0] != INPUT_DIM - BOTTLENECKS_OFFSET:
+                raise ValueError(f"{file} was written for another topology or PATHS")
+            self.files += [file]
+            self.shards += [shard]
+            self.scales += [bottleneck_scale(shard.dtype)]
+            added += 1
+        self.ends = np.cumsum([len(shard) for shard in self.shards], dtype=np.int64)
+        return added
+
+    def sample(self, batch_size: int) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        if len(self.batch) == 0 or len(self.batch[0]) != batch_size:
+            self.batch = (np.empty((batch_size, INPUT_DIM), dtype=np.float32), np.empty(batch_size, dtype=np.int64),
+                          np.empty(batch_size, dtype=np.float32), np.empty((batch_size, INPUT_DIM), dtype=np.float32),
+                          np.empty(batch_size, dtype=np.float32))
+        states, actions, rewards, next_states, dones = self.batch
+        indices: np.ndarray = np.sort(np.random.randint(0, len(self), batch_size))  # sorted, every shard is read in order
+        bounds: np.ndarray = np.searchsorted(indices, self.ends)
+        start: int = 0
+        for shard_idx, end in enumerate(bounds):
+            if end == start:
+                continue
+            records: np.ndarray = self.shards[shard_idx][indices[start:end] - (self.ends[shard_idx] - len(self.shards[shard_idx]))]
+            decode_states(records['state'], self.scales[shard_idx], states[start:end])
+            decode_states(records['next_state'], self.scales[shard_idx], next_states[start:end])
+            actions[start:end] = records['action']
+            rewards[start:end] = records['reward']
+            dones[start:end] = records['done']
+            start = end
+        return (torch.from_numpy(states), torch.from_numpy(actions), torch.from_numpy(rewards),
+                torch.from_numpy(next_states), torch.from_numpy(dones))
+
+
+if __name__ == '__main__':  # python transition_shards.py [directory] [updates]: trains a fresh Q-network on the shards only
+    dataset: ShardDataset = ShardDataset(sys.argv[1] if len(sys.argv) > 1 else SHARD_DIR)
+    print(f"{len(dataset)} transitions in {len(dataset.shards)} shards")
+    q_net: torch.nn.Sequential = build_q_net()
+    target_net: torch.nn.Sequential = copy.deepcopy(q_net)
+    loss_fn: torch.nn.Module = torch.nn.MSELoss()
+    optimizer: torch.optim.Optimizer = torch.optim.Adam(q_net.parameters(), lr=LEARNING_RATE)
+    losses: List[float] = []
+    for update in range(1, (int(sys.argv[2]) if len(sys.argv) > 2 else OFFLINE_UPDATES) + 1):
+        losses.append(train(q_net, target_net, optimizer, loss_fn, dataset))
+        if update % SYNC_FREQ == 0:
+            target_net.load_state_dict(q_net.state_dict())
+            print(f"{update} updates\tloss {np.mean(losses[-SYNC_FREQ:]):.4f}")
+    os.makedirs('models', exist_ok=True)
+    torch.save({'epoch': 0, 'model_state_dict': q_net.state_dict(), 'target_state_dict': target_net.state_dict()},
+               f'models/offline_{datetime.now().strftime("%d-%m-%Y_%H:%M:%S")}.pth')
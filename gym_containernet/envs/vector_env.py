@@ -0,0 +1,82 @@
+from slice_admission_env import SliceAdmissionEnv
+
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+import numpy as np
+from typing import Dict, List, Sequence
+
+from parameters import BACKEND, INPUT_DIM
+
+
+def step_and_reset(env: SliceAdmissionEnv, action: int) -> (np.ndarray, float, bool, Dict):
+    state, reward, done, info = env.step(action)
+    if done:  # automatic reset, the last observation of the episode goes in info
+        info = dict(info, terminal_observation=state.copy())
+        state = env.reset()
+    return state.copy(), reward, done, info
+
+
+def worker(connection: Connection, backend: str) -> None:
+    env: SliceAdmissionEnv = SliceAdmissionEnv(backend)
+    while True:
+        command, data = connection.recv()
+        if command == 'step':
+            connection.send(step_and_reset(env, data))
+        elif command == 'reset':
+            connection.send(env.reset().copy())
+        elif command == 'close':
+            connection.close()
+            return
+
+
+class SliceAdmissionVectorEnv:
+    def __init__(self, envs: int, backend: str = BACKEND, processes: bool = False) -> None:
+        if backend != 'fluid' and envs > 1:
+            raise ValueError("only one emulated SliceAdmissionEnv can run per host, use the fluid backend")
+
+        self.num_envs: int = envs
+        self.processes: bool = processes
+        self.envs: List[SliceAdmissionEnv] = []
+        self.connections: List[Connection] = []
+        self.workers: List[Process] = []
+
+        if processes:
+            for _ in range(envs):
+                connection, worker_connection = Pipe()
+                process: Process = Process(target=worker, args=(worker_connection, backend), daemon=True)
+                process.start()
+                worker_connection.close()
+                self.connections += [connection]
+                self.workers += [process]
+        else:
+            self.envs = [SliceAdmissionEnv(backend) for _ in range(envs)]
+
+    def reset(self) -> np.ndarray:
+        if self.processes:
+            for connection in self.connections:
+                connection.send(('reset', None))
+            states: List[np.ndarray] = [connection.recv() for connection in self.connections]
+        else:
+            states: List[np.ndarray] = [env.reset() for env in self.envs]
+        return np.stack(states).astype(np.float32).reshape(self.num_envs, INPUT_DIM)
+
+    def step(self, actions: Sequence[int]) -> (np.ndarray, np.ndarray, np.ndarray, List[Dict]):
+        if self.processes:
+            for connection, action in zip(self.connections, actions):
+                connection.send(('step', int(action)))
+            results: List = [connection.recv() for connection in self.connections]
+        else:
+            results: List = [step_and_reset(env, int(action)) for env, action in zip(self.envs, actions)]
+
+        states, rewards, dones, infos = zip(*results)
+        return np.stack(states).astype(np.float32).reshape(self.num_envs, INPUT_DIM), \
+            np.array(rewards, dtype=np.float32), np.array(dones, dtype=bool), list(infos)
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.workers:
+            process.join()
+        self.connections = []
+        self.workers = []